@@ -2,7 +2,67 @@
 AI Voice Proctoring - Double Voice Detection Module
 """
 
+import importlib
+
 from double_voice import detect_double_voice
 
-__all__ = ["detect_double_voice"]
+# The rest of the API is imported on first use, so importing the package only
+# loads the detector, as it always has
+_LAZY = {
+    "AVConsistencyMonitor": "av_consistency",
+    "AsyncDoubleVoiceDetector": "async_detector",
+    "AudioReader": "audio_reader",
+    "DetectorOverloaded": "async_detector",
+    "DoubleVoiceDetector": "double_voice",
+    "DoubleVoiceStream": "streaming",
+    "EmbeddingCache": "embedding_cache",
+    "EncoderBatcher": "encoder_batcher",
+    "RecordingIndex": "recording_index",
+    "ReferenceStore": "reference_store",
+    "auto_timestamps": "speech_turns",
+    "available_cpus": "execution_plan",
+    "detect_double_voice_async": "async_detector",
+    "detect_double_voice_batch": "double_voice",
+    "file_speech_mask": "vad",
+    "find_speech_without_lip_motion": "av_consistency",
+    "plan_execution": "execution_plan",
+    "speech_mask": "vad",
+    "speech_turns": "speech_turns",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+__all__ = [
+    "AVConsistencyMonitor",
+    "AsyncDoubleVoiceDetector",
+    "AudioReader",
+    "DetectorOverloaded",
+    "DoubleVoiceDetector",
+    "DoubleVoiceStream",
+    "EmbeddingCache",
+    "EncoderBatcher",
+    "RecordingIndex",
+    "ReferenceStore",
+    "auto_timestamps",
+    "available_cpus",
+    "detect_double_voice",
+    "detect_double_voice_async",
+    "detect_double_voice_batch",
+    "file_speech_mask",
+    "find_speech_without_lip_motion",
+    "plan_execution",
+    "speech_mask",
+    "speech_turns",
+]
 __version__ = "1.0.0"
@@ -0,0 +1,460 @@
+"""
+Asyncio Double Voice Detection Module
+"""
+
+import asyncio
+import threading
+import time
+import warnings
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from double_voice import (
+    DoubleVoiceDetector,
+    _check_scoring,
+    _prepare_recording,
+    _process_single_timestamp,
+    _queue_wait,
+    _release_shared_audio,
+    _resolve_timestamps,
+    _summarize_results,
+    _Trace,
+    _validate_timestamps,
+    _vad_settings,
+)
+from encoder_batcher import EncoderBatcher
+
+
+class DetectorOverloaded(RuntimeError):
+    """Raised when a request arrives while the admission queue is full."""
+
+
+class AsyncDoubleVoiceDetector:
+    """
+    Double voice detection for asyncio services.
+
+    Requests are admitted up to `max_concurrency` at a time; up to
+    `max_queue` more wait in line and anything beyond that is rejected with
+    DetectorOverloaded, so an overloaded service fails fast instead of
+    building up latency. Decoding, reference embedding and every segment run
+    in the wrapped detector's worker pool, and the event loop only awaits
+    their futures. At most one pool task per worker is in flight across all
+    requests, so cancelling a request (for example when the client
+    disconnects) drops its queued segments and only lets the segments that
+    already started finish.
+
+    When the wrapped detector has an EncoderBatcher (the default when no
+    detector is passed), the pool only decodes recordings and embeds
+    references. Segments are analysed on threads of this process, and the
+    batcher merges the forward passes of all in-flight requests.
+
+    Example:
+        detector = AsyncDoubleVoiceDetector(max_concurrency=8)
+        result = await detector.detect(timestamps, audio="recording.wav")
+    """
+
+    def __init__(
+        self,
+        detector: Optional[DoubleVoiceDetector] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: int = 32,
+    ):
+        """
+        Args:
+            detector: Detector whose worker pool, cache and batcher are used
+                (default: a new DoubleVoiceDetector with a new EncoderBatcher,
+                both closed together with this one)
+            max_concurrency: Requests processed at the same time (default:
+                twice the number of pool workers)
+            max_queue: Requests allowed to wait for a free slot before new
+                ones are rejected (default: 32)
+        """
+        self._owns_detector = detector is None
+        if detector is None:
+            # The pool forks its workers before the batcher thread starts
+            detector = DoubleVoiceDetector()
+            detector.batcher = EncoderBatcher(precision=detector.precision)
+        self.detector = detector
+        self.max_concurrency = max_concurrency or 2 * self.detector.max_workers
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._active = 0
+        self._waiting = 0
+        self._in_flight = 0
+        self._requests = asyncio.Semaphore(self.max_concurrency)
+        self._pool_slots = asyncio.Semaphore(self.detector.max_workers)
+
+    async def __aenter__(self) -> "AsyncDoubleVoiceDetector":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await asyncio.to_thread(self.close)
+
+    def close(self) -> None:
+        """Shut down the worker pool and batcher if this object created them."""
+        if self._owns_detector:
+            self.detector.close()
+            self.detector.batcher.close()
+
+    def stats(self) -> Dict:
+        """
+        Current load of the detector.
+
+        Returns:
+            Dictionary with active and waiting requests, pool tasks in
+            flight, the configured limits, the number of rejected requests
+            and, with a batcher, its counters under "batcher"
+        """
+        stats = {
+            "active": self._active,
+            "waiting": self._waiting,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+        if self.detector.batcher is not None:
+            stats["batcher"] = self.detector.batcher.stats()
+        return stats
+
+    async def detect(
+        self,
+        timestamps: List[List[float]],
+        audio: str,
+        threshold: float = 0.6,
+        different_speaker_threshold: float = 20.0,
+        window_size: float = 1.0,
+        hop_size: float = 0.5,
+        reference_id: Optional[str] = None,
+        vad_aggressiveness: Optional[int] = None,
+        vad_frame_ms: int = 30,
+        min_speech_ratio: float = 0.5,
+        return_diagnostics: bool = False,
+        scoring: str = "windows",
+    ) -> Dict:
+        """
+        Detect if multiple speakers are present in specified audio segments.
+
+        Same arguments and return value as DoubleVoiceDetector.detect().
+
+        Raises:
+            DetectorOverloaded: If max_concurrency requests are running and
+                max_queue more are already waiting
+        """
+        vad = _vad_settings(vad_aggressiveness, vad_frame_ms, min_speech_ratio)
+        _check_scoring(scoring, hop_size)
+
+        if isinstance(timestamps, str):
+            # Segmenting is a pass over the whole recording; keep it off the loop
+            timestamps = await asyncio.to_thread(
+                _resolve_timestamps, timestamps, audio, reference_id is None
+            )
+        if timestamps is None or len(timestamps) == 0:
+            return {"multiple_speakers_detected": "NO", "suspicious_segments": []}
+        timestamps = _validate_timestamps(timestamps)
+
+        async with self._admit():
+            if self.detector._executor is None:
+                # No pool to hand the work to; keep the event loop free at least
+                return await asyncio.to_thread(
+                    self.detector.detect,
+                    timestamps,
+                    audio,
+                    threshold=threshold,
+                    different_speaker_threshold=different_speaker_threshold,
+                    window_size=window_size,
+                    hop_size=hop_size,
+                    reference_id=reference_id,
+                    vad_aggressiveness=vad_aggressiveness,
+                    vad_frame_ms=vad_frame_ms,
+                    min_speech_ratio=min_speech_ratio,
+                    return_diagnostics=return_diagnostics,
+                    scoring=scoring,
+                )
+
+            trace = _Trace(audio)
+            results = await self._similarities(
+                timestamps,
+                audio,
+                window_size,
+                hop_size,
+                reference_id,
+                vad,
+                trace,
+                scoring,
+            )
+            summary = _summarize_results(
+                results,
+                threshold,
+                different_speaker_threshold,
+                report_skipped=vad is not None,
+            )
+            return self.detector._report(summary, results, trace, return_diagnostics)
+
+    @asynccontextmanager
+    async def _admit(self):
+        if self._requests.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise DetectorOverloaded(
+                f"{self._active} requests running and {self._waiting} waiting"
+            )
+        self._waiting += 1
+        try:
+            await self._requests.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._requests.release()
+
+    async def _run_in_pool(
+        self, fn: Callable, args: Tuple, on_abandon: Optional[Callable] = None
+    ):
+        # Submit one task once a pool slot is free and await it. A task that
+        # is cancelled after it started keeps running in its worker; its
+        # result is then handed to on_abandon for cleanup.
+        async with self._pool_slots:
+            future = self.detector._executor.submit(fn, args)
+            self._in_flight += 1
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                if not future.cancel() and on_abandon is not None:
+                    future.add_done_callback(on_abandon)
+                raise
+            finally:
+                self._in_flight -= 1
+
+    async def _similarities(
+        self,
+        timestamps: np.ndarray,
+        audio: str,
+        window_size: float,
+        hop_size: float,
+        reference_id: Optional[str],
+        vad: Optional[Tuple[int, int, float]],
+        trace: _Trace,
+        scoring: str = "windows",
+    ) -> List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]]:
+        detector = self.detector
+        # Reference store and cache lookups read files, so keep them off the loop
+        reference_embedding = await asyncio.to_thread(
+            detector._enrolled_reference, reference_id
+        )
+        with_reference = reference_embedding is None
+        cached_reference, reference_key, cached, cache_keys = await asyncio.to_thread(
+            detector._lookup_cache,
+            audio,
+            timestamps,
+            window_size,
+            hop_size,
+            with_reference=with_reference,
+            vad=vad,
+            scoring=scoring,
+        )
+        if with_reference:
+            reference_embedding = cached_reference
+            timestamps_to_check = timestamps[1:]
+        else:
+            timestamps_to_check = timestamps
+
+        spans = [
+            (i, float(start_time), float(end_time))
+            for i, (start_time, end_time) in enumerate(timestamps_to_check, start=1)
+            if i not in cached
+        ]
+        torch_threads = detector.torch_threads or max(
+            1, detector.cpus // detector.max_workers
+        )
+        # Concurrent requests share the whole pool, so every task gets one
+        # worker's share of the CPUs
+        trace.plan = {
+            "cpus": detector.cpus,
+            "workers": detector.max_workers,
+            "torch_threads": torch_threads,
+            "parallel": True,
+        }
+
+        results = []
+        shm_name = None
+        try:
+            if reference_embedding is None or spans:
+                reference_start = reference_end = None
+                if reference_embedding is None:
+                    reference_start, reference_end = map(float, timestamps[0])
+                args = (
+                    audio,
+                    reference_start,
+                    reference_end,
+                    detector.cache,
+                    reference_key,
+                    spans,
+                    detector.precision,
+                    torch_threads,
+                )
+                shm_name, layout, failed, embedded_reference, timing = (
+                    await self._run_in_pool(
+                        _prepare_recording, args, on_abandon=_release_prepared
+                    )
+                )
+                if reference_embedding is None:
+                    reference_embedding = embedded_reference
+                    trace.reference_time = timing["reference_time"]
+                for i, decode_time in timing["decode_times"].items():
+                    trace.segment(i, decode_time=decode_time)
+                results.extend(failed)
+            else:
+                layout = {}
+
+            for i, frame_embeddings in cached.items():
+                trace.segment(i, cached=True)
+                start_time, end_time = timestamps_to_check[i - 1]
+                frame_sims = frame_embeddings @ reference_embedding
+                results.append(
+                    (i, float(start_time), float(end_time), frame_sims, None)
+                )
+
+            async def analyze(i, start_time, end_time):
+                args = (
+                    i,
+                    start_time,
+                    end_time,
+                    shm_name,
+                    *layout[i],
+                    reference_embedding,
+                    16000,
+                    window_size,
+                    hop_size,
+                    detector.cache,
+                    cache_keys.get(i),
+                    vad,
+                    detector.precision,
+                    None if detector.batcher is not None else torch_threads,
+                    scoring,
+                )
+                submitted = time.time()
+                if detector.batcher is not None:
+                    # Forward passes merge with those of every other request
+                    result, timing = await asyncio.to_thread(
+                        _process_single_timestamp, args, detector.batcher
+                    )
+                else:
+                    result, timing = await self._run_in_pool(
+                        _process_single_timestamp, args
+                    )
+                trace.segment(
+                    i,
+                    worker=timing["worker"],
+                    queue_wait=_queue_wait(submitted, timing),
+                    analysis_time=timing["analysis_time"],
+                )
+                return result
+
+            # Longest segments first so they do not end up last in the queue
+            tasks = [
+                asyncio.ensure_future(analyze(*span))
+                for span in sorted(spans, key=lambda span: span[1] - span[2])
+                if span[0] in layout
+            ]
+            try:
+                outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                raise
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    warnings.warn(f"Segment processing failed: {outcome}")
+                else:
+                    results.append(outcome)
+        finally:
+            if shm_name is not None:
+                _release_shared_audio(shm_name)
+
+        results.sort(key=lambda x: x[0])
+        return results
+
+
+def _release_prepared(future) -> None:
+    # Done callback for a _prepare_recording task whose request was cancelled
+    if not future.cancelled() and future.exception() is None:
+        _release_shared_audio(future.result()[0])
+
+
+_default_detector = None
+_default_lock = threading.Lock()
+
+
+def _shared_detector() -> AsyncDoubleVoiceDetector:
+    global _default_detector
+    with _default_lock:
+        if _default_detector is None:
+            _default_detector = AsyncDoubleVoiceDetector()
+        return _default_detector
+
+
+async def detect_double_voice_async(
+    timestamps: List[List[float]],
+    audio: str,
+    threshold: float = 0.6,
+    different_speaker_threshold: float = 20.0,
+    window_size: float = 1.0,
+    hop_size: float = 0.5,
+    reference_id: Optional[str] = None,
+    vad_aggressiveness: Optional[int] = None,
+    vad_frame_ms: int = 30,
+    min_speech_ratio: float = 0.5,
+    return_diagnostics: bool = False,
+    scoring: str = "windows",
+    detector: Optional[AsyncDoubleVoiceDetector] = None,
+) -> Dict:
+    """
+    Detect if multiple speakers are present in specified audio segments.
+
+    Awaitable counterpart of detect_double_voice. Without `detector`, all
+    calls in the process share one AsyncDoubleVoiceDetector with default
+    limits, started on first use.
+
+    Args:
+        timestamps: 2D array of [start, end] time pairs in seconds
+        audio: Path to audio file to analyze
+        threshold: Similarity threshold for frame-level detection (default: 0.6)
+        different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+        window_size: Size of the analysis window in seconds (default: 1.0)
+        hop_size: Step size between windows in seconds (default: 0.5)
+        reference_id: Enrolled candidate to compare against instead of the first timestamp
+        vad_aggressiveness: Enable VAD gating with this webrtcvad mode (0-3) (default: None, off)
+        vad_frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+        min_speech_ratio: Fraction of speech frames a window needs to be embedded (default: 0.5)
+        return_diagnostics: Add per-request and per-segment timings under
+            "diagnostics" (default: False)
+        scoring: "windows" or "partials", as in detect_double_voice (default: "windows")
+        detector: Detector to run on, with its own pool and limits
+
+    Returns:
+        Dictionary containing detection result and suspicious segments
+
+    Raises:
+        DetectorOverloaded: If the detector's admission queue is full
+    """
+    if detector is None:
+        # Starting the pool takes a while; do it off the event loop
+        detector = await asyncio.to_thread(_shared_detector)
+
+    return await detector.detect(
+        timestamps,
+        audio,
+        threshold=threshold,
+        different_speaker_threshold=different_speaker_threshold,
+        window_size=window_size,
+        hop_size=hop_size,
+        reference_id=reference_id,
+        vad_aggressiveness=vad_aggressiveness,
+        vad_frame_ms=vad_frame_ms,
+        min_speech_ratio=min_speech_ratio,
+        return_diagnostics=return_diagnostics,
+        scoring=scoring,
+    )
@@ -0,0 +1,196 @@
+"""
+Seekable Audio Reader for Random Timestamp Access
+"""
+
+import math
+from collections import OrderedDict
+import numpy as np
+import librosa
+import soundfile as sf
+import soxr
+from typing import Optional
+
+
+class AudioReader:
+    """
+    Random access to a recording at a fixed sampling rate.
+
+    Only the blocks that overlap a requested range are decoded: the file is
+    seeked to the block, read, mixed down to mono and resampled. Decoded
+    blocks are kept in a size-bounded LRU cache, so overlapping or nearby
+    timestamps are decoded once. Formats soundfile cannot open are decoded
+    in full on first access instead.
+
+    The reader can be sliced like the decoded signal, so code written for a
+    NumPy array works unchanged:
+
+    Example:
+        with AudioReader("exam.wav") as y:
+            segment = y[int(3300 * 16000) : int(3310 * 16000)]
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: int = 16000,
+        block_size: float = 5.0,
+        max_cache_bytes: int = 64 * 1024**2,
+    ):
+        """
+        Args:
+            path: Audio file to read
+            sample_rate: Sampling rate of the returned samples (default: 16000)
+            block_size: Length of a decoded block in seconds (default: 5.0)
+            max_cache_bytes: Size limit of the decoded block cache (default: 64 MiB)
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_cache_bytes = max_cache_bytes
+        self._blocks = OrderedDict()
+        self._cached_bytes = 0
+        self._signal = None
+
+        # Missing or unreadable files raise their own OSError here instead
+        # of reaching the full-decode fallback, which is only for formats
+        with open(path, "rb"):
+            pass
+
+        try:
+            self._file = sf.SoundFile(path)
+        except (sf.LibsndfileError, RuntimeError):
+            # Not seekable through libsndfile (e.g. compressed containers)
+            self._file = None
+            self._signal = self._decode_all()
+            self._n_samples = len(self._signal)
+            return
+
+        source_rate = self._file.samplerate
+        frames = self._file.frames
+        # Blocks start on sample positions shared by both rates, so every
+        # block maps to a whole number of source and output samples
+        g = math.gcd(source_rate, sample_rate)
+        self._source_period = source_rate // g
+        self._output_period = sample_rate // g
+        periods = max(1, round(block_size * sample_rate / self._output_period))
+        self._output_block = periods * self._output_period
+        self._source_block = periods * self._source_period
+        # Filter context decoded around each block when resampling, ~50 ms
+        self._margin_periods = math.ceil(0.05 * sample_rate / self._output_period)
+        self._n_samples = int(np.ceil(frames * sample_rate / source_rate))
+
+    def __len__(self) -> int:
+        return self._n_samples
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("AudioReader only supports contiguous slices")
+        start, stop, _ = key.indices(self._n_samples)
+        return self.read_samples(start, stop)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def duration(self) -> float:
+        """Length of the recording in seconds."""
+        return self._n_samples / self.sample_rate
+
+    def read(self, start_time: float, end_time: Optional[float] = None) -> np.ndarray:
+        """
+        Samples between two times in seconds, clipped to the recording.
+
+        Args:
+            start_time: Start of the range in seconds
+            end_time: End of the range in seconds (default: end of the recording)
+        """
+        start = int(start_time * self.sample_rate)
+        stop = self._n_samples if end_time is None else int(end_time * self.sample_rate)
+        return self.read_samples(start, stop)
+
+    def read_samples(self, start: int, stop: int) -> np.ndarray:
+        """Samples in [start, stop) at the output rate, clipped to the recording."""
+        start = max(0, start)
+        stop = min(stop, self._n_samples)
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        if self._signal is not None:
+            return self._signal[start:stop]
+
+        first = start // self._output_block
+        last = (stop - 1) // self._output_block
+        offset = first * self._output_block
+        if first == last:
+            return self._block(first)[start - offset : stop - offset]
+        blocks = [self._block(k) for k in range(first, last + 1)]
+        return np.concatenate(blocks)[start - offset : stop - offset]
+
+    def close(self) -> None:
+        """Close the file and drop the decoded blocks."""
+        if self._file is not None:
+            self._file.close()
+        self._blocks.clear()
+        self._cached_bytes = 0
+
+    def _decode_all(self) -> np.ndarray:
+        y, _ = librosa.load(self.path, sr=self.sample_rate)
+        return y.astype(np.float32, copy=False)
+
+    def _block(self, k: int) -> np.ndarray:
+        block = self._blocks.get(k)
+        if block is not None:
+            self._blocks.move_to_end(k)
+            return block
+
+        block = self._decode_block(k)
+        self._blocks[k] = block
+        self._cached_bytes += block.nbytes
+        # Always keep the block just decoded, even if it alone is over the limit
+        while self._cached_bytes > self.max_cache_bytes and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+        return block
+
+    def _decode_block(self, k: int) -> np.ndarray:
+        source_rate = self._file.samplerate
+        frames = self._file.frames
+        out_start = k * self._output_block
+        out_len = min(self._output_block, self._n_samples - out_start)
+
+        if source_rate == self.sample_rate:
+            self._file.seek(out_start)
+            return self._to_mono(
+                self._file.read(out_len, dtype="float32", always_2d=True)
+            )
+
+        # Decode with some context on both sides so the resampling filter
+        # sees the same neighbourhood as when resampling the whole file
+        src_start = k * self._source_block
+        margin = self._margin_periods if src_start > 0 else 0
+        margin = min(margin, src_start // self._source_period)
+        read_start = src_start - margin * self._source_period
+        read_stop = min(
+            frames,
+            src_start + self._source_block + self._margin_periods * self._source_period,
+        )
+        self._file.seek(read_start)
+        chunk = self._to_mono(
+            self._file.read(read_stop - read_start, dtype="float32", always_2d=True)
+        )
+        resampled = soxr.resample(
+            chunk, source_rate, self.sample_rate, quality="soxr_hq"
+        )
+
+        lead = margin * self._output_period
+        block = resampled[lead : lead + out_len]
+        if len(block) < out_len:
+            block = np.pad(block, (0, out_len - len(block)))
+        return block.astype(np.float32, copy=False)
+
+    @staticmethod
+    def _to_mono(data: np.ndarray) -> np.ndarray:
+        if data.shape[1] == 1:
+            return data[:, 0]
+        return data.mean(axis=1)
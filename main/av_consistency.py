@@ -0,0 +1,303 @@
+"""
+Audio-Visual Consistency: Speech Without Lip Motion
+"""
+
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+
+Interval = Tuple[float, float]
+
+# Samples closer than this are treated as touching
+_EPS = 1e-6
+
+
+def _runs(starts: np.ndarray, ends: np.ndarray) -> List[Interval]:
+    # Merge sorted [start, end) samples into maximal runs of touching samples
+    if len(starts) == 0:
+        return []
+    breaks = np.flatnonzero(starts[1:] > ends[:-1] + _EPS) + 1
+    first = np.concatenate(([0], breaks))
+    run_ends = np.maximum.reduceat(ends, first)
+    return list(zip(starts[first].tolist(), run_ends.tolist()))
+
+
+def _merge(intervals: List[Interval], gap: float = 0.0) -> List[Interval]:
+    # Sorted-by-start intervals joined when less than `gap` apart
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + gap:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _intersect(a: List[Interval], b: List[Interval]) -> List[Interval]:
+    # Two-pointer sweep over two sorted, disjoint interval lists
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _subtract(a: List[Interval], b: List[Interval]) -> List[Interval]:
+    # Parts of a not covered by b, both sorted and disjoint
+    result = []
+    j = 0
+    for start, end in a:
+        while j < len(b) and b[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] < end:
+            if b[k][0] > start:
+                result.append((start, b[k][0]))
+            start = max(start, b[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _clip(intervals: List[Interval], low: float, high: float) -> List[Interval]:
+    return [
+        (max(start, low), min(end, high))
+        for start, end in intervals
+        if end > low and start < high
+    ]
+
+
+def _unexplained(
+    speech: List[Interval],
+    covered: List[Interval],
+    lips: List[Interval],
+    lip_tolerance: float,
+) -> List[Interval]:
+    # Speech while a video frame was seen and no lip motion within the tolerance
+    lips = _merge([(start - lip_tolerance, end + lip_tolerance) for start, end in lips])
+    return _subtract(_intersect(speech, covered), lips)
+
+
+def _video_samples(
+    times: np.ndarray, max_frame_gap: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    # A video sample holds until the next frame, at most max_frame_gap
+    ends = np.minimum(times[1:], times[:-1] + max_frame_gap)
+    return times[:-1], ends
+
+
+def find_speech_without_lip_motion(
+    audio_times: np.ndarray,
+    speech: np.ndarray,
+    video_times: np.ndarray,
+    lip_motion: np.ndarray,
+    frame_ms: int = 30,
+    lip_tolerance: float = 0.25,
+    merge_gap: float = 0.3,
+    min_duration: float = 0.5,
+    max_frame_gap: float = 0.5,
+) -> List[List[float]]:
+    """
+    Intervals where the microphone hears speech but the lips do not move.
+
+    Both streams must use the same clock. Audio frames cover frame_ms from
+    their timestamp; a video frame holds until the next one. Time not covered
+    by any video frame is never reported.
+
+    Args:
+        audio_times: Start time of every VAD frame in seconds, ascending
+        speech: VAD decision of every audio frame
+        video_times: Capture time of every video frame in seconds, ascending
+        lip_motion: Lip-motion decision of every video frame
+        frame_ms: Length of a VAD frame in milliseconds (default: 30)
+        lip_tolerance: Seconds of lip motion that still explain nearby speech,
+            covering audio-video offset and detector delay (default: 0.25)
+        merge_gap: Intervals closer than this in seconds are joined (default: 0.3)
+        min_duration: Shortest interval reported in seconds (default: 0.5)
+        max_frame_gap: Longest time in seconds a video frame holds when
+            frames are missing (default: 0.5)
+
+    Returns:
+        List of [start, end] intervals in seconds
+    """
+    audio_times = np.asarray(audio_times, dtype=np.float64)
+    speech = np.asarray(speech, dtype=bool)
+    video_times = np.asarray(video_times, dtype=np.float64)
+    lip_motion = np.asarray(lip_motion, dtype=bool)
+    if len(audio_times) != len(speech) or len(video_times) != len(lip_motion):
+        raise ValueError("Every timestamp needs exactly one decision")
+
+    frame_seconds = frame_ms / 1000
+    speech_runs = _runs(audio_times[speech], audio_times[speech] + frame_seconds)
+    starts, ends = _video_samples(video_times, max_frame_gap)
+    covered = _runs(starts, ends)
+    lips = _runs(starts[lip_motion[:-1]], ends[lip_motion[:-1]])
+
+    flagged = _merge(_unexplained(speech_runs, covered, lips, lip_tolerance), merge_gap)
+    return [[start, end] for start, end in flagged if end - start >= min_duration]
+
+
+class _Track:
+    # Runs of touching samples, built one sample at a time; the last run
+    # stays open until a gap or a negative sample closes it
+    def __init__(self):
+        self.closed = []
+        self.open = None
+
+    def add(self, start: float, end: float, flag: bool) -> None:
+        if flag and self.open is not None and start <= self.open[1] + _EPS:
+            self.open = (self.open[0], max(self.open[1], end))
+            return
+        if self.open is not None:
+            self.closed.append(self.open)
+            self.open = None
+        if flag:
+            self.open = (start, end)
+
+    def intervals(self) -> List[Interval]:
+        return self.closed + [self.open] if self.open is not None else list(self.closed)
+
+    def prune(self, before: float) -> None:
+        # Drop runs that ended before a time no longer queried
+        keep = 0
+        while keep < len(self.closed) and self.closed[keep][1] < before:
+            keep += 1
+        del self.closed[:keep]
+
+
+class AVConsistencyMonitor:
+    """
+    Streaming detection of speech without lip motion.
+
+    Feed VAD frames and lip-motion frames as they arrive, in any interleaving
+    and at their own rates, stamped with the same clock. Each stream is kept
+    as runs of intervals; poll() sweeps the time both streams have reached
+    (minus lip_tolerance, since later lip motion can still explain speech)
+    and returns the intervals that can no longer change. Results match
+    find_speech_without_lip_motion() over the same frames. The methods may
+    be called from different threads, e.g. an audio callback and a video
+    pipeline.
+
+    Example:
+        monitor = AVConsistencyMonitor()
+        monitor.add_audio(frame_time, vad.is_speech(frame, 16000))
+        monitor.add_video(result["timestamp"], result["speaking"])
+        for start, end in monitor.poll():
+            print(f"Speech without lip motion: {start:.1f}s - {end:.1f}s")
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = 30,
+        lip_tolerance: float = 0.25,
+        merge_gap: float = 0.3,
+        min_duration: float = 0.5,
+        max_frame_gap: float = 0.5,
+    ):
+        """
+        Args:
+            frame_ms: Length of a VAD frame in milliseconds (default: 30)
+            lip_tolerance: Seconds of lip motion that still explain nearby speech (default: 0.25)
+            merge_gap: Intervals closer than this in seconds are joined (default: 0.3)
+            min_duration: Shortest interval reported in seconds (default: 0.5)
+            max_frame_gap: Longest time in seconds a video frame holds (default: 0.5)
+        """
+        self.frame_seconds = frame_ms / 1000
+        self.lip_tolerance = lip_tolerance
+        self.merge_gap = merge_gap
+        self.min_duration = min_duration
+        self.max_frame_gap = max_frame_gap
+
+        self._speech = _Track()
+        self._covered = _Track()
+        self._lips = _Track()
+        self._audio_end = None
+        self._last_video: Optional[Tuple[float, bool]] = None
+        self._done = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add_audio(self, timestamp: float, is_speech: bool) -> None:
+        """Add one VAD frame starting at timestamp."""
+        end = timestamp + self.frame_seconds
+        with self._lock:
+            self._speech.add(timestamp, end, bool(is_speech))
+            self._audio_end = (
+                end if self._audio_end is None else max(self._audio_end, end)
+            )
+            if self._done is None:
+                self._done = timestamp
+
+    def add_video(self, timestamp: float, lip_motion: bool) -> None:
+        """Add one video frame captured at timestamp."""
+        with self._lock:
+            if self._last_video is not None:
+                # The previous frame holds until this one
+                previous, moving = self._last_video
+                end = min(timestamp, previous + self.max_frame_gap)
+                self._covered.add(previous, end, True)
+                self._lips.add(previous, end, moving)
+            self._last_video = (timestamp, bool(lip_motion))
+
+    def poll(self) -> List[List[float]]:
+        """
+        Intervals of speech without lip motion that are complete.
+
+        Returns:
+            List of [start, end] intervals in seconds, each reported once
+        """
+        with self._lock:
+            if self._audio_end is None or self._last_video is None:
+                return []
+            watermark = min(self._audio_end, self._last_video[0]) - self.lip_tolerance
+            return self._advance(watermark, final=False)
+
+    def flush(self) -> List[List[float]]:
+        """Report the remaining intervals once both streams have ended."""
+        with self._lock:
+            if self._audio_end is None or self._last_video is None:
+                return []
+            return self._advance(max(self._audio_end, self._last_video[0]), final=True)
+
+    def _advance(self, watermark: float, final: bool) -> List[List[float]]:
+        if watermark > self._done:
+            low, high = self._done, watermark
+            lip_window = self.lip_tolerance
+            flagged = _unexplained(
+                _clip(self._speech.intervals(), low, high),
+                _clip(self._covered.intervals(), low, high),
+                _clip(self._lips.intervals(), low - lip_window, high + lip_window),
+                self.lip_tolerance,
+            )
+            for start, end in _clip(flagged, low, high):
+                if self._pending and start <= self._pending[-1][1] + self.merge_gap:
+                    self._pending[-1] = (
+                        self._pending[-1][0],
+                        max(self._pending[-1][1], end),
+                    )
+                else:
+                    self._pending.append((start, end))
+            self._done = watermark
+
+            for track in (self._speech, self._covered, self._lips):
+                track.prune(watermark - 2 * self.lip_tolerance)
+
+        # Later speech starts at or after the watermark, so intervals ending
+        # more than merge_gap before it are final
+        output = []
+        while self._pending and (
+            final or self._pending[0][1] + self.merge_gap < watermark
+        ):
+            start, end = self._pending.pop(0)
+            if end - start >= self.min_duration:
+                output.append([start, end])
+        return output
@@ -0,0 +1,329 @@
+"""
+Performance Benchmark for Double Voice Detection
+
+Times every stage of the pipeline over ./assets/*.wav and compares the
+results with a stored baseline:
+
+    python benchmark.py                     # compare with benchmark_baseline.json
+    python benchmark.py --update-baseline   # store this run as the new baseline
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import itertools
+import numpy as np
+import torch
+from resemblyzer import preprocess_wav
+from audio_reader import AudioReader
+from double_voice import (
+    PRECISIONS,
+    DoubleVoiceDetector,
+    _encode_partials,
+    _frame_mels,
+    _frame_starts,
+    _frame_statistics,
+    _get_encoder,
+)
+
+DATASET_FOLDER = "./assets"
+BASELINE_FILE = "benchmark_baseline.json"
+
+STAGES = ["decode", "preprocess", "mel", "encoder", "similarity"]
+
+bench_grid = {
+    "segment_length": [5.0, 10.0, 20.0],
+    "window": [(0.5, 0.25), (1.0, 0.5), (1.5, 0.75)],
+}
+
+
+def generate_timestamps(duration, segment_length):
+    """Consecutive [start, end] segments of segment_length seconds."""
+    timestamps = []
+    start = 0.0
+    while start < duration:
+        end = min(start + segment_length, duration)
+        timestamps.append([start, end])
+        start += segment_length
+    return timestamps
+
+
+def profile_stages(path, timestamps, window_size, hop_size, precision="float32"):
+    """
+    Run the sequential pipeline on one file and time each stage separately.
+
+    Mirrors what detect() does per segment, with the reference embedded the
+    same way as the analysis windows, so the stage totals add up to the
+    in-process cost of a detection.
+    """
+    enc = _get_encoder(precision)
+    timings = dict.fromkeys(STAGES, 0.0)
+    window_samples = int(16000 * window_size)
+    hop_samples = int(16000 * hop_size)
+    min_frame_length = int(16000 * 0.3)
+
+    t = time.perf_counter()
+    with AudioReader(path, sample_rate=16000) as reader:
+        pieces = [reader.read(start, end) for start, end in timestamps]
+    timings["decode"] += time.perf_counter() - t
+
+    t = time.perf_counter()
+    processed = [preprocess_wav(piece) for piece in pieces]
+    timings["preprocess"] += time.perf_counter() - t
+
+    reference = processed[0]
+    t = time.perf_counter()
+    mels, frame_index = _frame_mels(enc, reference, [0], len(reference))
+    timings["mel"] += time.perf_counter() - t
+    t = time.perf_counter()
+    reference_embedding = _encode_partials(enc, mels, frame_index, 1)[0]
+    timings["encoder"] += time.perf_counter() - t
+
+    for segment in processed[1:]:
+        starts = _frame_starts(
+            len(segment), window_samples, hop_samples, min_frame_length
+        )
+        if not starts:
+            continue
+
+        t = time.perf_counter()
+        mels, frame_index = _frame_mels(enc, segment, starts, window_samples)
+        timings["mel"] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        frame_embeddings = _encode_partials(enc, mels, frame_index, len(starts))
+        timings["encoder"] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        _frame_statistics(frame_embeddings @ reference_embedding)
+        timings["similarity"] += time.perf_counter() - t
+
+    return timings
+
+
+def time_detection(detector, path, timestamps, window_size, hop_size):
+    """Wall time of one end-to-end detection."""
+    start = time.perf_counter()
+    detector.frame_similarities(
+        timestamps, path, window_size=window_size, hop_size=hop_size
+    )
+    return time.perf_counter() - start
+
+
+def run_benchmark(files, repeat=3, max_workers=None, precision="float32"):
+    """
+    Benchmark every configuration of bench_grid over `files`.
+
+    Each configuration is run `repeat` times and the fastest run of every
+    stage is kept, which is the least noisy estimate on a shared machine.
+
+    Returns:
+        Dictionary with run metadata and one entry per configuration
+    """
+    durations = {}
+    for path in files:
+        with AudioReader(path) as reader:
+            durations[path] = reader.duration
+    total_audio = sum(durations.values())
+    configs = list(
+        itertools.product(bench_grid["segment_length"], bench_grid["window"])
+    )
+
+    print(
+        f"Benchmarking {len(configs)} configurations over {len(files)} files "
+        f"({total_audio:.0f}s of audio, {repeat} runs each)..."
+    )
+
+    results = []
+    sequential = DoubleVoiceDetector(parallel=False, precision=precision)
+    parallel = DoubleVoiceDetector(
+        parallel=True, max_workers=max_workers, precision=precision
+    )
+    # The detectors fall back to float32 where bf16 is not supported
+    precision = sequential.precision
+    try:
+        # Load the models and start the pool before anything is timed
+        warm_up = generate_timestamps(durations[files[0]], 5.0)
+        for detector in (sequential, parallel):
+            time_detection(detector, files[0], warm_up, 1.0, 0.5)
+
+        for segment_length, (window_size, hop_size) in configs:
+            stages = dict.fromkeys(STAGES, float("inf"))
+            end_to_end = {"sequential": float("inf"), "parallel": float("inf")}
+
+            for _ in range(repeat):
+                run_stages = dict.fromkeys(STAGES, 0.0)
+                run_end_to_end = dict.fromkeys(end_to_end, 0.0)
+                for path in files:
+                    timestamps = generate_timestamps(durations[path], segment_length)
+                    timings = profile_stages(
+                        path, timestamps, window_size, hop_size, precision
+                    )
+                    for stage in STAGES:
+                        run_stages[stage] += timings[stage]
+                    for mode, detector in (
+                        ("sequential", sequential),
+                        ("parallel", parallel),
+                    ):
+                        run_end_to_end[mode] += time_detection(
+                            detector, path, timestamps, window_size, hop_size
+                        )
+                stages = {k: min(stages[k], run_stages[k]) for k in stages}
+                end_to_end = {
+                    k: min(end_to_end[k], run_end_to_end[k]) for k in end_to_end
+                }
+
+            result = {
+                "segment_length": segment_length,
+                "window_size": window_size,
+                "hop_size": hop_size,
+                "stages": {k: round(v, 4) for k, v in stages.items()},
+                "end_to_end": {k: round(v, 4) for k, v in end_to_end.items()},
+                "rtf": {k: round(v / total_audio, 5) for k, v in end_to_end.items()},
+            }
+            results.append(result)
+            print(
+                f"  segment={segment_length:>4}s window={window_size}s hop={hop_size}s  "
+                + "  ".join(f"{k}={v:.3f}s" for k, v in result["stages"].items())
+                + f"  sequential={end_to_end['sequential']:.3f}s"
+                + f"  parallel={end_to_end['parallel']:.3f}s"
+            )
+    finally:
+        sequential.close()
+        parallel.close()
+
+    return {
+        "meta": {
+            "files": [os.path.basename(path) for path in files],
+            "audio_seconds": round(total_audio, 2),
+            "repeat": repeat,
+            "precision": precision,
+            "max_workers": parallel.max_workers,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance=0.2, min_delta=0.005):
+    """
+    List the timings that got slower than the baseline.
+
+    A timing regresses when it is more than `tolerance` (relative) and
+    `min_delta` seconds (absolute) slower than the same configuration in the
+    baseline. Configurations missing from the baseline are not compared.
+
+    Returns:
+        One message per regressed timing
+    """
+
+    def key(result):
+        return (result["segment_length"], result["window_size"], result["hop_size"])
+
+    baseline_results = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_results.get(key(result))
+        if previous is None:
+            continue
+        for group in ("stages", "end_to_end"):
+            for name, seconds in result[group].items():
+                before = previous[group].get(name)
+                if before is None:
+                    continue
+                if seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                    regressions.append(
+                        f"segment={result['segment_length']}s "
+                        f"window={result['window_size']}s hop={result['hop_size']}s "
+                        f"{group}.{name}: {before:.3f}s -> {seconds:.3f}s "
+                        f"(+{(seconds / before - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", default=os.path.join(DATASET_FOLDER, "*.wav"))
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Only use the first N files"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32")
+    parser.add_argument(
+        "--output", default=None, help="Write the report to this JSON file"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown per timing before the run fails (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    files = sorted(glob.glob(args.files))[: args.limit]
+    if not files:
+        print(f"No audio files match {args.files}")
+        return 2
+
+    report = run_benchmark(
+        files,
+        repeat=args.repeat,
+        max_workers=args.max_workers,
+        precision=args.precision,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["files"] != report["meta"]["files"]:
+        print(
+            "\nBaseline was recorded on a different set of files; run with --update-baseline"
+        )
+        return 2
+    if baseline["meta"].get("precision", "float32") != report["meta"]["precision"]:
+        print(
+            f"\nBaseline was recorded with precision={baseline['meta'].get('precision', 'float32')}; "
+            "use --baseline to compare against a baseline of the same precision"
+        )
+        return 2
+
+    regressions = compare_with_baseline(report, baseline, tolerance=args.tolerance)
+    if regressions:
+        print(
+            f"\n{len(regressions)} timings regressed by more than {args.tolerance:.0%}:"
+        )
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+"""
+Double Voice Detection Daemon
+
+Keeps one warm worker pool per host and accepts detection jobs over a UNIX
+domain socket or a localhost TCP socket:
+
+    python daemon.py --socket /tmp/double_voice.sock
+    python daemon.py --port 7341 --max-workers 8 --cache ~/.cache/double_voice
+
+Messages are newline-delimited JSON objects, or msgpack maps behind a 4-byte
+big-endian length with --protocol msgpack. Every request may carry an "id"
+that is echoed in its response. Requests on one connection run concurrently
+and their responses are sent as soon as each one finishes:
+
+    {"id": 1, "op": "detect", "audio": "exam.wav", "timestamps": [[0, 5], [5, 15]]}
+    {"id": 2, "op": "detect", "pcm": "<base64 int16>", "sample_rate": 16000,
+     "timestamps": [[0, 5], [5, 15]], "params": {"threshold": 0.65}}
+    {"id": 3, "op": "health"}
+    {"id": 4, "op": "stats"}
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+import soundfile as sf
+from typing import Dict, List, Optional, Union
+from async_detector import AsyncDoubleVoiceDetector, DetectorOverloaded
+from double_voice import PRECISIONS, DoubleVoiceDetector
+from embedding_cache import EmbeddingCache
+from encoder_batcher import EncoderBatcher
+from reference_store import ReferenceStore
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+PROTOCOLS = ("json", "msgpack")
+
+# Largest accepted message; raw PCM makes requests large (~10 min of 16 kHz audio)
+MAX_MESSAGE_BYTES = 64 * 1024**2
+
+_DETECT_PARAMS = {
+    "threshold",
+    "different_speaker_threshold",
+    "window_size",
+    "hop_size",
+    "reference_id",
+    "vad_aggressiveness",
+    "vad_frame_ms",
+    "min_speech_ratio",
+    "return_diagnostics",
+    "scoring",
+}
+
+
+def _json_default(value):
+    # NumPy scalars and arrays that end up in results or diagnostics
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _check_protocol(protocol: str) -> None:
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"protocol must be one of {PROTOCOLS}")
+    if protocol == "msgpack" and msgpack is None:
+        raise ImportError("The msgpack protocol requires the msgpack package")
+
+
+def _encode(message: Dict, protocol: str) -> bytes:
+    if protocol == "json":
+        return json.dumps(message, default=_json_default).encode() + b"\n"
+    payload = msgpack.packb(message, default=_json_default)
+    return struct.pack(">I", len(payload)) + payload
+
+
+def _decode(data: bytes, protocol: str) -> Dict:
+    if protocol == "json":
+        return json.loads(data)
+    return msgpack.unpackb(data)
+
+
+async def _read_message(reader: asyncio.StreamReader, protocol: str) -> Optional[bytes]:
+    # One framed message, or None once the peer closed the connection
+    try:
+        if protocol == "json":
+            line = await reader.readline()
+            return line or None
+        (length,) = struct.unpack(">I", await reader.readexactly(4))
+        if length > MAX_MESSAGE_BYTES:
+            raise ValueError(f"Message of {length} bytes is over the size limit")
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+class DetectionServer:
+    """
+    Socket front end for an AsyncDoubleVoiceDetector.
+
+    One server holds one warm worker pool, so every client on the host
+    shares the same loaded models. Jobs from all connections go through the
+    detector's admission control; a full queue is answered with an
+    "overloaded" error instead of waiting. Jobs of a connection that closes
+    are cancelled.
+
+    Example:
+        server = DetectionServer(AsyncDoubleVoiceDetector(DoubleVoiceDetector()))
+        asyncio.run(server.serve_unix("/tmp/double_voice.sock"))
+    """
+
+    def __init__(self, detector: AsyncDoubleVoiceDetector, protocol: str = "json"):
+        """
+        Args:
+            detector: Detector the jobs run on
+            protocol: Message format, "json" or "msgpack" (default: "json")
+        """
+        _check_protocol(protocol)
+        self.detector = detector
+        self.protocol = protocol
+        self.started = time.time()
+        self.connections = 0
+        self._server = None
+
+    async def serve_unix(self, path: str) -> None:
+        """Listen on a UNIX domain socket at `path` until stopped."""
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=path, limit=MAX_MESSAGE_BYTES
+        )
+        logger.info(f"Listening on {path}")
+        try:
+            await self._server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 7341) -> None:
+        """Listen on a TCP socket until stopped."""
+        self._server = await asyncio.start_server(
+            self._handle, host=host, port=port, limit=MAX_MESSAGE_BYTES
+        )
+        logger.info(f"Listening on {host}:{port}")
+        await self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Stop accepting connections; serve_unix/serve_tcp then return."""
+        if self._server is not None:
+            self._server.close()
+
+    def health(self) -> Dict:
+        """Liveness and load of the daemon."""
+        detector = self.detector.detector
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "workers": detector.max_workers,
+            "precision": detector.precision,
+            "connections": self.connections,
+            **self.detector.stats(),
+        }
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        lock = asyncio.Lock()
+        jobs = set()
+
+        async def send(message):
+            async with lock:
+                writer.write(_encode(message, self.protocol))
+                await writer.drain()
+
+        async def run(request):
+            response = await self._respond(request)
+            try:
+                await send(response)
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                data = await _read_message(reader, self.protocol)
+                if data is None:
+                    break
+                try:
+                    request = _decode(data, self.protocol)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be an object")
+                except Exception as e:
+                    await send(
+                        {
+                            "ok": False,
+                            "error": f"Invalid message: {e}",
+                            "type": "invalid",
+                        }
+                    )
+                    continue
+                job = asyncio.ensure_future(run(request))
+                jobs.add(job)
+                job.add_done_callback(jobs.discard)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Closing connection: {e}")
+        finally:
+            # The client is gone; stop spending CPU on its jobs
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            self.connections -= 1
+            writer.close()
+
+    async def _respond(self, request: Dict) -> Dict:
+        response = {"id": request.get("id")}
+        op = request.get("op", "detect")
+        try:
+            if op == "health":
+                response["result"] = self.health()
+            elif op == "stats":
+                response["result"] = self.detector.stats()
+            elif op == "detect":
+                response["result"] = await self._detect(request)
+            else:
+                raise ValueError(f"Unknown op: {op}")
+            response["ok"] = True
+        except DetectorOverloaded as e:
+            response.update(ok=False, error=str(e), type="overloaded")
+        except (TypeError, ValueError, KeyError) as e:
+            response.update(ok=False, error=str(e), type="invalid")
+        except Exception as e:
+            logger.exception("Detection job failed")
+            response.update(ok=False, error=str(e), type="failed")
+        return response
+
+    async def _detect(self, request: Dict) -> Dict:
+        params = request.get("params") or {}
+        unknown = set(params) - _DETECT_PARAMS
+        if unknown:
+            raise TypeError(f"Unknown detection parameters: {sorted(unknown)}")
+
+        if request.get("pcm") is None:
+            return await self.detector.detect(
+                request["timestamps"], request["audio"], **params
+            )
+
+        # Raw PCM is staged in a temporary WAV file so the pool workers can
+        # read it like any other recording
+        path = await asyncio.to_thread(
+            _write_pcm, request["pcm"], int(request.get("sample_rate", 16000))
+        )
+        try:
+            return await self.detector.detect(request["timestamps"], path, **params)
+        finally:
+            os.unlink(path)
+
+
+def _write_pcm(pcm: Union[str, bytes], sample_rate: int) -> str:
+    # Mono little-endian int16 samples, base64-encoded in JSON messages
+    if isinstance(pcm, str):
+        pcm = base64.b64decode(pcm)
+    samples = np.frombuffer(pcm, dtype="<i2")
+    fd, path = tempfile.mkstemp(prefix="double_voice_", suffix=".wav")
+    with os.fdopen(fd, "wb") as f:
+        sf.write(f, samples, sample_rate, subtype="PCM_16", format="WAV")
+    return path
+
+
+class DaemonClient:
+    """
+    Blocking client for a running detection daemon.
+
+    Example:
+        with DaemonClient(socket_path="/tmp/double_voice.sock") as client:
+            result = client.detect(timestamps, audio="exam.wav")
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 7341,
+        protocol: str = "json",
+        timeout: Optional[float] = None,
+    ):
+        """
+        Args:
+            socket_path: UNIX domain socket of the daemon; TCP is used when None
+            host: Daemon host for TCP (default: "127.0.0.1")
+            port: Daemon port for TCP (default: 7341)
+            protocol: Message format the daemon was started with (default: "json")
+            timeout: Socket timeout in seconds (default: None, wait indefinitely)
+        """
+        _check_protocol(protocol)
+        self.protocol = protocol
+        if socket_path is not None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = socket_path
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (host, port)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        self._file = self._sock.makefile("rb")
+        self._next_id = 0
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection; jobs still running for it are cancelled."""
+        self._file.close()
+        self._sock.close()
+
+    def detect(
+        self,
+        timestamps: List[List[float]],
+        audio: Optional[str] = None,
+        pcm: Optional[Union[bytes, np.ndarray]] = None,
+        sample_rate: int = 16000,
+        **params,
+    ) -> Dict:
+        """
+        Run one detection on the daemon.
+
+        Args:
+            timestamps: 2D array of [start, end] time pairs in seconds, or "auto"
+            audio: Path to the audio file, as seen by the daemon
+            pcm: Mono int16 samples (array or bytes) to send instead of a path
+            sample_rate: Sampling rate of `pcm` (default: 16000)
+            **params: Detection parameters of detect_double_voice, such as
+                threshold, window_size or reference_id
+
+        Returns:
+            Dictionary containing detection result and suspicious segments
+        """
+        request = {
+            "op": "detect",
+            "timestamps": (
+                timestamps
+                if isinstance(timestamps, str)
+                else np.asarray(timestamps, dtype=float).tolist()
+            ),
+            "params": params,
+        }
+        if pcm is not None:
+            pcm = (
+                np.asarray(pcm, dtype="<i2").tobytes()
+                if not isinstance(pcm, bytes)
+                else pcm
+            )
+            request["pcm"] = (
+                pcm if self.protocol == "msgpack" else base64.b64encode(pcm).decode()
+            )
+            request["sample_rate"] = sample_rate
+        else:
+            request["audio"] = audio
+        return self._call(request)
+
+    def health(self) -> Dict:
+        """Liveness, pool size and current load of the daemon."""
+        return self._call({"op": "health"})
+
+    def stats(self) -> Dict:
+        """Active, waiting and rejected requests of the daemon."""
+        return self._call({"op": "stats"})
+
+    def _call(self, request: Dict) -> Dict:
+        self._next_id += 1
+        request["id"] = self._next_id
+        self._sock.sendall(_encode(request, self.protocol))
+
+        if self.protocol == "json":
+            data = self._file.readline()
+        else:
+            header = self._file.read(4)
+            data = (
+                self._file.read(struct.unpack(">I", header)[0])
+                if len(header) == 4
+                else b""
+            )
+        if not data:
+            raise ConnectionError("The daemon closed the connection")
+
+        response = _decode(data, self.protocol)
+        if not response.get("ok"):
+            if response.get("type") == "overloaded":
+                raise DetectorOverloaded(response["error"])
+            raise RuntimeError(response.get("error"))
+        return response["result"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--socket", default=None, help="UNIX domain socket to listen on"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7341)
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="json")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--torch-threads", type=int, default=None)
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32")
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--cache", default=None, help="Embedding cache directory")
+    parser.add_argument("--references", default=None, help="Reference store directory")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Partials per merged forward pass across requests; 0 encodes in the pool",
+    )
+    parser.add_argument("--batch-wait", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    _check_protocol(args.protocol)
+
+    detector = DoubleVoiceDetector(
+        max_workers=args.max_workers,
+        cache=EmbeddingCache(args.cache) if args.cache else None,
+        references=(
+            ReferenceStore(args.references, args.precision) if args.references else None
+        ),
+        precision=args.precision,
+        torch_threads=args.torch_threads,
+    )
+    # Started after the pool has forked its workers
+    batcher = None
+    if args.batch_size > 0:
+        batcher = EncoderBatcher(args.batch_size, args.batch_wait, detector.precision)
+        detector.batcher = batcher
+    server = DetectionServer(
+        AsyncDoubleVoiceDetector(
+            detector, max_concurrency=args.max_concurrency, max_queue=args.max_queue
+        ),
+        protocol=args.protocol,
+    )
+    logger.info(f"Started {detector.max_workers} workers ({detector.precision})")
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, server.stop)
+        try:
+            if args.socket:
+                await server.serve_unix(args.socket)
+            else:
+                await server.serve_tcp(args.host, args.port)
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(serve())
+    finally:
+        detector.close()
+        if batcher is not None:
+            batcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,47 +4,221 @@ Double Voice Detection Module
 
 import numpy as np
 import librosa
+import torch
 from resemblyzer import VoiceEncoder, preprocess_wav
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from typing import List, Tuple, Dict
+from resemblyzer import hparams
+from resemblyzer.audio import normalize_volume, wav_to_mel_spectrogram
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from multiprocessing import resource_tracker, shared_memory
+from typing import TYPE_CHECKING, Callable, List, Tuple, Dict, Optional, Union
+from audio_reader import AudioReader
+from embedding_cache import EmbeddingCache
+from encoder_batcher import EncoderBatcher
+from execution_plan import available_cpus, plan_execution
+from reference_store import ReferenceStore
+from vad import speech_mask
+import logging
 import warnings
+import time
+import os
 
+if TYPE_CHECKING:
+    from recording_index import RecordingIndex
 
-def _process_segment_frames(
-    audio_data: np.ndarray,
-    reference_embedding: np.ndarray,
-    sample_rate: int = 16000,
-    window_size: float = 1.0,
-    hop_size: float = 0.5,
-    different_speaker_threshold: float = 20.0,
-    threshold: float = 0.6,
-) -> Dict:
-    enc = VoiceEncoder()
+logger = logging.getLogger(__name__)
 
-    window_samples = int(sample_rate * window_size)
-    hop_samples = int(sample_rate * hop_size)
-    min_frame_length = int(sample_rate * 0.3)
+PRECISIONS = ("float32", "int8", "bf16")
+
+# "windows" embeds every analysis window on its own; "partials" embeds each
+# segment once and scores the encoder's overlapping 1.6 s partials
+SCORING_MODES = ("windows", "partials")
 
-    frame_similarities = []
+# Voice encoders of the current process by precision, loaded lazily by _get_encoder()
+_encoders = {}
 
-    i = 0
-    while i < len(audio_data):
-        frame = audio_data[i : i + window_samples]
+
+def _bf16_supported() -> bool:
+    # Native bf16 matrix units; elsewhere bf16 is emulated and slower than float32
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return any(flag in flags for flag in ("avx512_bf16", "amx_bf16", " bf16"))
+
+
+def _check_precision(precision: str) -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}")
+    if precision == "bf16" and not _bf16_supported():
+        warnings.warn("This CPU has no native bf16 support; using float32")
+        return "float32"
+    return precision
+
+
+def _to_bf16(module, args):
+    return tuple(arg.to(torch.bfloat16) for arg in args)
+
+
+def _to_float32(module, args, output):
+    return output.float()
+
+
+def _get_encoder(precision: str = "float32") -> VoiceEncoder:
+    encoder = _encoders.get(precision)
+    if encoder is not None:
+        return encoder
+
+    t = time.perf_counter()
+    if precision == "float32":
+        encoder = VoiceEncoder(verbose=False)
+    elif precision == "int8":
+        # Dynamic quantization of the linear layer: int8 weights, activations
+        # quantized on the fly. The LSTM stays in float32; quantizing it
+        # moved similarities by 0.13 on average, enough to flip verdicts
+        encoder = torch.ao.quantization.quantize_dynamic(
+            VoiceEncoder(device="cpu", verbose=False),
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+        )
+    elif precision == "bf16":
+        # Inputs are cast on the way in and embeddings back to float32, so
+        # callers such as embed_utterance keep working with float32 arrays
+        encoder = VoiceEncoder(device="cpu", verbose=False).to(torch.bfloat16)
+        encoder.register_forward_pre_hook(_to_bf16)
+        encoder.register_forward_hook(_to_float32)
+    else:
+        raise ValueError(f"precision must be one of {PRECISIONS}")
+
+    logger.debug(
+        f"Loaded the {precision} voice encoder in {time.perf_counter() - t:.2f} seconds"
+    )
+    _encoders[precision] = encoder
+    return encoder
+
+
+def _init_worker(precision: str = "float32", torch_threads: int = 1) -> None:
+    # Pool initializer: load the encoder once per worker process, with its
+    # share of the CPUs as torch threads so the workers do not oversubscribe
+    _set_torch_threads(torch_threads)
+    _get_encoder(precision)
+
+
+def _set_torch_threads(torch_threads: Optional[int]) -> None:
+    if torch_threads and torch.get_num_threads() != torch_threads:
+        torch.set_num_threads(torch_threads)
+
+
+def _warm_up_worker() -> int:
+    return os.getpid()
+
+
+def _frame_starts(
+    n_samples: int, window_samples: int, hop_samples: int, min_frame_length: int
+) -> List[int]:
+    if hop_samples <= 0:
+        raise ValueError("hop_size must be positive")
+
+    starts = []
+    for i in range(0, n_samples, hop_samples):
         # If frame is shorter than min_frame_length and not the last frame, skip
-        if len(frame) < min_frame_length and (i + window_samples < len(audio_data)):
-            i += hop_samples
+        frame_len = min(window_samples, n_samples - i)
+        if frame_len < min_frame_length and (i + window_samples < n_samples):
             continue
         # If last frame is shorter, still process it
-        try:
-            frame_emb = enc.embed_utterance(frame)
-            frame_sim = np.dot(reference_embedding, frame_emb)
-            frame_similarities.append(frame_sim)
-        except Exception as e:
-            warnings.warn(f"Error processing frame at index {i}: {e}")
-            # continue to next frame
-        i += hop_samples
-
-    if not frame_similarities:
+        starts.append(i)
+    return starts
+
+
+def _embed_frames(
+    enc: VoiceEncoder,
+    audio_data: np.ndarray,
+    starts: List[int],
+    window_samples: int,
+    batcher: Optional[EncoderBatcher] = None,
+) -> np.ndarray:
+    # Equivalent to enc.embed_utterance(frame) for every frame, but with one
+    # mel computation per padded window length and a single forward pass
+    mels, frame_index = _frame_mels(enc, audio_data, starts, window_samples)
+    return _encode_partials(enc, mels, frame_index, len(starts), batcher)
+
+
+def _frame_mels(
+    enc: VoiceEncoder,
+    audio_data: np.ndarray,
+    starts: List[int],
+    window_samples: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Mel partials of every window, stacked for one forward pass, and the
+    # window each partial belongs to. Windows are grouped by their padded
+    # length so they can be stacked; all full windows share one group, only
+    # the trailing partial windows differ.
+    groups = {}
+    for n, i in enumerate(starts):
+        frame_len = min(window_samples, len(audio_data) - i)
+        wav_slices, mel_slices = enc.compute_partial_slices(frame_len, 1.3, 0.75)
+        padded_len = max(frame_len, wav_slices[-1].stop)
+        group = groups.setdefault(padded_len, ([], [], mel_slices))
+        group[0].append(n)
+        group[1].append(i)
+
+    partials = []
+    owners = []
+    for padded_len, (frame_ids, frame_starts, mel_slices) in groups.items():
+        frames = np.zeros((len(frame_starts), padded_len), dtype=np.float32)
+        for row, i in enumerate(frame_starts):
+            frame = audio_data[i : i + window_samples]
+            frames[row, : len(frame)] = frame
+
+        mels = librosa.feature.melspectrogram(
+            y=frames,
+            sr=hparams.sampling_rate,
+            n_fft=int(hparams.sampling_rate * hparams.mel_window_length / 1000),
+            hop_length=int(hparams.sampling_rate * hparams.mel_window_step / 1000),
+            n_mels=hparams.mel_n_channels,
+        )
+        mels = mels.astype(np.float32).transpose(0, 2, 1)
+
+        for s in mel_slices:
+            partials.append(mels[:, s])
+            owners.append(frame_ids)
+
+    return np.concatenate(partials), np.concatenate(owners)
+
+
+def _encode_partials(
+    enc: VoiceEncoder,
+    mels: np.ndarray,
+    frame_index: np.ndarray,
+    n_frames: int,
+    batcher: Optional[EncoderBatcher] = None,
+) -> np.ndarray:
+    if batcher is not None:
+        # Shares a forward pass with the other requests waiting on the batcher
+        partial_embeds = batcher.encode(mels)
+    else:
+        with torch.no_grad():
+            batch = torch.from_numpy(mels).to(enc.device)
+            partial_embeds = enc(batch).cpu().numpy()
+
+    # Average the partials belonging to each frame and L2-normalise
+    raw_embeds = np.zeros((n_frames, partial_embeds.shape[1]), dtype=np.float32)
+    np.add.at(raw_embeds, frame_index, partial_embeds)
+    raw_embeds /= np.bincount(frame_index, minlength=n_frames)[:, None]
+    return raw_embeds / np.linalg.norm(raw_embeds, axis=1, keepdims=True)
+
+
+def _frame_statistics(
+    frame_sims: np.ndarray,
+    threshold: float = 0.6,
+    different_speaker_threshold: float = 20.0,
+) -> Dict:
+    # Windows skipped by the VAD gate carry NaN and are left out of the statistics
+    skipped = np.isnan(frame_sims)
+    skipped_frames = int(np.sum(skipped))
+    frame_sims = frame_sims[~skipped]
+
+    if len(frame_sims) == 0:
         return {
             "has_multiple_speakers": False,
             "overall_similarity": 0.0,
@@ -53,9 +227,9 @@ def _process_segment_frames(
             "std_similarity": 0.0,
             "different_frames_percentage": 0.0,
             "total_frames": 0,
+            "skipped_frames": skipped_frames,
         }
 
-    frame_sims = np.array(frame_similarities)
     overall_sim = np.mean(frame_sims)
     min_sim = np.min(frame_sims)
     max_sim = np.max(frame_sims)
@@ -68,178 +242,1587 @@ def _process_segment_frames(
     has_multiple_speakers = different_percentage > different_speaker_threshold
 
     return {
-        "has_multiple_speakers": has_multiple_speakers,
+        "has_multiple_speakers": bool(has_multiple_speakers),
         "overall_similarity": float(overall_sim),
         "min_similarity": float(min_sim),
         "max_similarity": float(max_sim),
         "std_similarity": float(std_sim),
         "different_frames_percentage": float(different_percentage),
         "total_frames": total_frames,
+        "skipped_frames": skipped_frames,
     }
 
 
-def _process_single_timestamp(args: Tuple) -> Tuple[int, float, float, Dict]:
+def _vad_settings(
+    vad_aggressiveness: Optional[int],
+    vad_frame_ms: int = 30,
+    min_speech_ratio: float = 0.5,
+) -> Optional[Tuple[int, int, float]]:
+    if vad_aggressiveness is None:
+        return None
+    if vad_aggressiveness not in (0, 1, 2, 3):
+        raise ValueError("vad_aggressiveness must be 0, 1, 2 or 3")
+    if vad_frame_ms not in (10, 20, 30):
+        raise ValueError("vad_frame_ms must be 10, 20 or 30")
+    if not 0.0 <= min_speech_ratio <= 1.0:
+        raise ValueError("min_speech_ratio must be between 0 and 1")
+    return (vad_aggressiveness, vad_frame_ms, min_speech_ratio)
+
+
+def _speech_mask(
+    audio_data: np.ndarray, sample_rate: int, frame_ms: int, aggressiveness: int
+) -> np.ndarray:
+    # One VAD decision per frame_ms frame, computed over a single int16 buffer
+    return speech_mask(audio_data, sample_rate, aggressiveness, frame_ms)
+
+
+def _check_scoring(scoring: str, hop_size: float) -> None:
+    if scoring not in SCORING_MODES:
+        raise ValueError(f"scoring must be one of {SCORING_MODES}")
+    if scoring == "partials" and not 0.01 <= hop_size <= 1.6:
+        # Partials are 1.6 s long and must cover the whole segment
+        raise ValueError(
+            "hop_size must be between 0.01 and 1.6 with scoring='partials'"
+        )
+
+
+def _speech_windows(
+    audio_data: np.ndarray,
+    starts: List[int],
+    window_samples: int,
+    sample_rate: int,
+    vad: Tuple[int, int, float],
+) -> np.ndarray:
+    aggressiveness, frame_ms, min_speech_ratio = vad
+    frame_samples = sample_rate * frame_ms // 1000
+    mask = _speech_mask(audio_data, sample_rate, frame_ms, aggressiveness)
+    if len(mask) == 0:
+        return np.ones(len(starts), dtype=bool)
+
+    # Speech ratio of every window from a cumulative sum over VAD frames
+    speech_cumsum = np.concatenate(([0], np.cumsum(mask)))
+    starts = np.asarray(starts)
+    first = np.minimum(starts // frame_samples, len(mask) - 1)
+    last = np.minimum(
+        np.maximum((starts + window_samples) // frame_samples, first + 1), len(mask)
+    )
+    speech_ratio = (speech_cumsum[last] - speech_cumsum[first]) / (last - first)
+    return speech_ratio >= min_speech_ratio
+
+
+def _segment_partials(
+    audio_data: np.ndarray,
+    sample_rate: int = 16000,
+    hop_size: float = 0.5,
+    vad: Optional[Tuple[int, int, float]] = None,
+    precision: str = "float32",
+    batcher: Optional[EncoderBatcher] = None,
+) -> np.ndarray:
+    # One row per 1.6 s partial of embed_utterance(return_partials=True,
+    # rate=1/hop_size): one mel computation over the whole segment, and
+    # each partial embedding is scored on its own instead of averaged
+    if len(audio_data) == 0:
+        return np.empty((0, hparams.model_embedding_size), dtype=np.float32)
+
+    enc = _get_encoder(precision)
+    wav_slices, mel_slices = enc.compute_partial_slices(
+        len(audio_data), rate=1.0 / hop_size, min_coverage=0.75
+    )
+    padded_len = max(len(audio_data), wav_slices[-1].stop)
+    wav = np.pad(audio_data, (0, padded_len - len(audio_data)))
+    mel = wav_to_mel_spectrogram(wav)
+    mels = np.stack([mel[s] for s in mel_slices])
+
+    speech = np.ones(len(mel_slices), dtype=bool)
+    if vad is not None:
+        # The wav slices place every partial on the segment's sample axis
+        starts = [s.start for s in wav_slices]
+        partial_samples = wav_slices[0].stop - wav_slices[0].start
+        speech = _speech_windows(wav, starts, partial_samples, sample_rate, vad)
+
+    partial_embeddings = np.full(
+        (len(mel_slices), hparams.model_embedding_size), np.nan, dtype=np.float32
+    )
+    n_speech = int(np.sum(speech))
+    if n_speech:
+        partial_embeddings[speech] = _encode_partials(
+            enc, mels[speech], np.arange(n_speech), n_speech, batcher
+        )
+    return partial_embeddings
+
+
+def _segment_embeddings(
+    audio_data: np.ndarray,
+    sample_rate: int = 16000,
+    window_size: float = 1.0,
+    hop_size: float = 0.5,
+    vad: Optional[Tuple[int, int, float]] = None,
+    precision: str = "float32",
+    batcher: Optional[EncoderBatcher] = None,
+    scoring: str = "windows",
+) -> np.ndarray:
+    if scoring == "partials":
+        return _segment_partials(
+            audio_data, sample_rate, hop_size, vad, precision, batcher
+        )
+
+    window_samples = int(sample_rate * window_size)
+    hop_samples = int(sample_rate * hop_size)
+    min_frame_length = int(sample_rate * 0.3)
+
+    starts = _frame_starts(
+        len(audio_data), window_samples, hop_samples, min_frame_length
+    )
+    if not starts:
+        return np.empty((0, hparams.model_embedding_size), dtype=np.float32)
+
+    if vad is None:
+        return _embed_frames(
+            _get_encoder(precision), audio_data, starts, window_samples, batcher
+        )
+
+    # Only embed windows with enough speech; skipped windows stay NaN
+    speech = _speech_windows(audio_data, starts, window_samples, sample_rate, vad)
+    frame_embeddings = np.full(
+        (len(starts), hparams.model_embedding_size), np.nan, dtype=np.float32
+    )
+    if np.any(speech):
+        speech_starts = [s for s, keep in zip(starts, speech) if keep]
+        frame_embeddings[speech] = _embed_frames(
+            _get_encoder(precision), audio_data, speech_starts, window_samples, batcher
+        )
+    return frame_embeddings
+
+
+def _process_segment_frames(
+    audio_data: np.ndarray,
+    reference_embedding: np.ndarray,
+    sample_rate: int = 16000,
+    window_size: float = 1.0,
+    hop_size: float = 0.5,
+    different_speaker_threshold: float = 20.0,
+    threshold: float = 0.6,
+) -> Dict:
+    frame_embeddings = _segment_embeddings(
+        audio_data, sample_rate=sample_rate, window_size=window_size, hop_size=hop_size
+    )
+    frame_sims = frame_embeddings @ reference_embedding
+
+    return _frame_statistics(frame_sims, threshold, different_speaker_threshold)
+
+
+def _segment_bounds(
+    start_time: float, end_time: float, n_samples: int, sample_rate: int
+) -> Tuple[int, int]:
+    start_sample = int(start_time * sample_rate)
+    end_sample = int(end_time * sample_rate)
+
+    if start_sample >= n_samples:
+        raise ValueError(f"Start time {start_time}s is beyond audio duration")
+    if end_sample > n_samples:
+        end_sample = n_samples
+    if start_sample >= end_sample:
+        raise ValueError("Start time must be less than end time")
+    return start_sample, end_sample
+
+
+def _failed_segment(
+    index: int, start_time: float, end_time: float, error: Exception
+) -> Tuple[int, float, float, None, str]:
+    warnings.warn(f"Error processing timestamp [{start_time}, {end_time}]: {error}")
+    return (index, start_time, end_time, None, str(error))
+
+
+def _pack_segments(
+    y: Union[np.ndarray, AudioReader],
+    spans: List[Tuple[int, float, float]],
+    sample_rate: int = 16000,
+) -> Tuple[str, Dict[int, Tuple[int, int]], List[Tuple], Dict[int, float]]:
+    # Copy only the requested segments into one shared memory block so pool
+    # workers can map them by name. Returns the block name, the (offset,
+    # length) of each segment in it, failed results for invalid bounds and
+    # the time spent decoding each segment. The caller unlinks the block
+    # with _release_shared_audio.
+    layout = {}
+    bounds = {}
+    failed = []
+    decode_times = {}
+    total = 0
+    # In time order, so consecutive reads hit the reader's block cache
+    for i, start_time, end_time in sorted(spans, key=lambda span: span[1]):
+        try:
+            bounds[i] = _segment_bounds(start_time, end_time, len(y), sample_rate)
+        except ValueError as e:
+            failed.append(_failed_segment(i, start_time, end_time, e))
+            continue
+        length = bounds[i][1] - bounds[i][0]
+        layout[i] = (total, length)
+        total += length
+
+    shm = shared_memory.SharedMemory(create=True, size=max(total * 4, 1))
+    try:
+        shared = np.ndarray((total,), dtype=np.float32, buffer=shm.buf)
+        for i, (offset, length) in layout.items():
+            start_sample, end_sample = bounds[i]
+            t = time.perf_counter()
+            shared[offset : offset + length] = y[start_sample:end_sample]
+            decode_times[i] = time.perf_counter() - t
+        del shared
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, layout, failed, decode_times
+
+
+def _release_shared_audio(shm_name: str) -> None:
+    # Unlink a block created by _pack_segments, possibly in a pool worker
+    shm = shared_memory.SharedMemory(name=shm_name)
+    shm.close()
+    shm.unlink()
+
+
+def _release_prepared(future) -> None:
+    # Done callback for a _prepare_recording task whose result is no longer
+    # wanted; the worker still packed the recording into shared memory
+    if future.cancelled() or future.exception() is not None:
+        return
+    shm_name = future.result()[0]
+    if shm_name is not None:
+        _release_shared_audio(shm_name)
+
+
+def _reference_embedding(
+    y: Union[np.ndarray, AudioReader],
+    start_time: float,
+    end_time: float,
+    sample_rate: int = 16000,
+    precision: str = "float32",
+) -> np.ndarray:
+    start_sample = int(start_time * sample_rate)
+    end_sample = int(end_time * sample_rate)
+    reference_wav = preprocess_wav(y[start_sample:end_sample])
+    return _get_encoder(precision).embed_utterance(reference_wav)
+
+
+def _prepare_recording(
+    args: Tuple,
+) -> Tuple[str, Dict[int, Tuple[int, int]], List[Tuple], np.ndarray, Dict]:
+    # Batch mode: read a recording inside a worker, embed its reference and
+    # leave the pending segments in shared memory for the segment tasks.
+    # Without reference times the reference is known and not embedded.
     (
-        index,
-        start_time,
-        end_time,
-        audio_path,
-        reference_embedding,
-        sample_rate,
-        window_size,
-        hop_size,
-        threshold,
-        different_speaker_threshold,
+        audio,
+        reference_start,
+        reference_end,
+        cache,
+        reference_key,
+        spans,
+        precision,
+        torch_threads,
     ) = args
 
-    try:
-        y, sr = librosa.load(audio_path, sr=None)
+    _set_torch_threads(torch_threads)
+    t = time.perf_counter()
+    with AudioReader(audio, sample_rate=16000) as y:
+        reference_embedding = None
+        if reference_start is not None:
+            reference_embedding = _reference_embedding(
+                y, reference_start, reference_end, precision=precision
+            )
+            if cache is not None:
+                cache.put(reference_key, reference_embedding)
+        reference_time = time.perf_counter() - t
+        shm_name, layout, failed, decode_times = _pack_segments(y, spans)
+    timing = {"reference_time": reference_time, "decode_times": decode_times}
+    return shm_name, layout, failed, reference_embedding, timing
+
+
+def _resolve_timestamps(timestamps, audio: str, with_reference: bool = True):
+    # timestamps="auto" segments the recording into speech turns, with the
+    # cleanest long turn first as reference unless one is enrolled
+    if not isinstance(timestamps, str):
+        return timestamps
+    if timestamps != "auto":
+        raise ValueError('timestamps must be a 2D array or "auto"')
+
+    from speech_turns import auto_timestamps
+
+    return auto_timestamps(audio, with_reference=with_reference)
+
+
+def _validate_timestamps(timestamps) -> np.ndarray:
+    if not isinstance(timestamps, (list, np.ndarray)):
+        raise TypeError("timestamps must be a list or numpy array")
+
+    timestamps = np.array(timestamps)
+    if timestamps.ndim != 2 or timestamps.shape[1] != 2:
+        raise ValueError("timestamps must be a 2D array with shape (n, 2)")
+    return timestamps
 
-        start_sample = int(start_time * sr)
-        end_sample = int(end_time * sr)
 
-        if start_sample >= len(y):
-            raise ValueError(f"Start time {start_time}s is beyond audio duration")
-        if end_sample > len(y):
-            end_sample = len(y)
-        if start_sample >= end_sample:
-            raise ValueError("Start time must be less than end time")
+class _Trace:
+    # Timings of one detection request, reported as its diagnostics
 
-        segment = y[start_sample:end_sample]
-        processed_segment = preprocess_wav(segment, source_sr=sr)
+    def __init__(self, audio: str):
+        self.audio = audio
+        self.started = time.perf_counter()
+        self.reference_time = 0.0
+        self.plan = None
+        self.segments = {}
 
-        results = _process_segment_frames(
+    def segment(self, index: int, **fields) -> None:
+        self.segments.setdefault(index, {}).update(fields)
+
+    def report(
+        self,
+        results: List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]],
+    ) -> Dict:
+        segments = []
+        for index, start_time, end_time, frame_sims, error in results:
+            entry = {
+                "index": index,
+                "start": start_time,
+                "end": end_time,
+                "cached": False,
+                "worker": None,
+                "queue_wait": 0.0,
+                "decode_time": 0.0,
+                "analysis_time": 0.0,
+            }
+            entry.update(self.segments.get(index, {}))
+            skipped = 0 if frame_sims is None else int(np.sum(np.isnan(frame_sims)))
+            entry["frames_embedded"] = (
+                0 if frame_sims is None else len(frame_sims) - skipped
+            )
+            entry["frames_skipped"] = skipped
+            entry["error"] = error
+            segments.append(entry)
+
+        return {
+            "audio": self.audio,
+            "wall_time": time.perf_counter() - self.started,
+            "reference_time": self.reference_time,
+            "decode_time": sum(s["decode_time"] for s in segments),
+            "frames_embedded": sum(s["frames_embedded"] for s in segments),
+            "frames_skipped": sum(s["frames_skipped"] for s in segments),
+            "plan": self.plan,
+            "segments": segments,
+        }
+
+
+def _summarize_results(
+    results: List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]],
+    threshold: float,
+    different_speaker_threshold: float,
+    report_skipped: bool = False,
+) -> Dict:
+    suspicious_segments = []
+    embedded_frames = 0
+    skipped_frames = 0
+    for index, start_time, end_time, frame_sims, error in results:
+        if error is not None:
+            continue
+        analysis = _frame_statistics(frame_sims, threshold, different_speaker_threshold)
+        embedded_frames += analysis["total_frames"]
+        skipped_frames += analysis["skipped_frames"]
+        if analysis["has_multiple_speakers"]:
+            suspicious_segments.append([start_time, end_time])
+
+    detection_result = "YES" if suspicious_segments else "NO"
+
+    logger.info(f"Multiple speakers detected: {detection_result}")
+    if detection_result == "YES":
+        for seg in suspicious_segments:
+            logger.info(f"  [{seg[0]:.1f}s - {seg[1]:.1f}s]")
+
+    summary = {
+        "multiple_speakers_detected": detection_result,
+        "suspicious_segments": suspicious_segments,
+    }
+    if report_skipped:
+        summary["embedded_frames"] = embedded_frames
+        summary["skipped_frames"] = skipped_frames
+    return summary
+
+
+def _analyze_segment(
+    index: int,
+    start_time: float,
+    end_time: float,
+    segment: np.ndarray,
+    reference_embedding: np.ndarray,
+    sample_rate: int,
+    window_size: float,
+    hop_size: float,
+    cache: Optional[EmbeddingCache] = None,
+    cache_key: Optional[str] = None,
+    vad: Optional[Tuple[int, int, float]] = None,
+    precision: str = "float32",
+    batcher: Optional[EncoderBatcher] = None,
+    scoring: str = "windows",
+) -> Tuple[int, float, float, Optional[np.ndarray], Optional[str]]:
+    try:
+        # Already at the encoder sampling rate, so only normalize and trim.
+        # With VAD gating the speech mask takes the place of trimming long
+        # silences: the gate gets to see the silence, and window times stay
+        # on the recording's clock.
+        if vad is None:
+            processed_segment = preprocess_wav(segment)
+        else:
+            processed_segment = normalize_volume(
+                segment, hparams.audio_norm_target_dBFS, increase_only=True
+            )
+
+        frame_embeddings = _segment_embeddings(
             processed_segment,
-            reference_embedding,
             sample_rate=sample_rate,
             window_size=window_size,
             hop_size=hop_size,
-            threshold=threshold,
-            different_speaker_threshold=different_speaker_threshold,
+            vad=vad,
+            precision=precision,
+            batcher=batcher,
+            scoring=scoring,
         )
+        if cache is not None:
+            cache.put(cache_key, frame_embeddings)
 
-        return (index, start_time, end_time, results)
+        return (
+            index,
+            start_time,
+            end_time,
+            frame_embeddings @ reference_embedding,
+            None,
+        )
 
     except Exception as e:
-        warnings.warn(f"Error processing timestamp [{start_time}, {end_time}]: {e}")
-        return (
+        return _failed_segment(index, start_time, end_time, e)
+
+
+def _process_single_timestamp(
+    args: Tuple,
+    batcher: Optional[EncoderBatcher] = None,
+) -> Tuple[Tuple[int, float, float, Optional[np.ndarray], Optional[str]], Dict]:
+    # Runs in a pool worker, or on a thread of the parent with a batcher
+    (
+        index,
+        start_time,
+        end_time,
+        shm_name,
+        offset,
+        length,
+        reference_embedding,
+        sample_rate,
+        window_size,
+        hop_size,
+        cache,
+        cache_key,
+        vad,
+        precision,
+        torch_threads,
+        scoring,
+    ) = args
+
+    started = time.time()
+    _set_torch_threads(torch_threads)
+    t = time.perf_counter()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        segment = np.ndarray(
+            (length,), dtype=np.float32, buffer=shm.buf, offset=offset * 4
+        )
+        result = _analyze_segment(
             index,
             start_time,
             end_time,
-            {
-                "has_multiple_speakers": False,
-                "overall_similarity": 0.0,
-                "error": str(e),
-            },
+            segment,
+            reference_embedding,
+            sample_rate,
+            window_size,
+            hop_size,
+            cache=cache,
+            cache_key=cache_key,
+            vad=vad,
+            precision=precision,
+            batcher=batcher,
+            scoring=scoring,
         )
+        # Release the view before closing the mapping
+        del segment
+        timing = {
+            "worker": os.getpid(),
+            "started": started,
+            "analysis_time": time.perf_counter() - t,
+        }
+        return result, timing
+    finally:
+        shm.close()
 
 
-def detect_double_voice(
-    timestamps: List[List[float]],
-    audio: str,
-    parallel: bool = True,
-    threshold: float = 0.6,
-    different_speaker_threshold: float = 20.0,
-    window_size: float = 1.0,
-    hop_size: float = 0.5,
-) -> Dict:
+# Longest a pool task may run before its recording is reported as failed
+_TASK_TIMEOUT = 60.0
+
+_BATCH_PARAMS = {
+    "threshold": 0.6,
+    "different_speaker_threshold": 20.0,
+    "window_size": 1.0,
+    "hop_size": 0.5,
+    "vad_aggressiveness": None,
+    "vad_frame_ms": 30,
+    "min_speech_ratio": 0.5,
+    "scoring": "windows",
+    "return_diagnostics": False,
+    "reference_id": None,
+}
+
+
+def _normalize_job(job: Tuple) -> Tuple[str, np.ndarray, Dict]:
+    if len(job) == 2:
+        audio, timestamps = job
+        params = {}
+    elif len(job) == 3:
+        audio, timestamps, params = job
+        params = params or {}
+    else:
+        raise ValueError("batch jobs must be (audio, timestamps[, params]) tuples")
+
+    unknown = set(params) - set(_BATCH_PARAMS)
+    if unknown:
+        raise TypeError(f"Unknown detection parameters: {sorted(unknown)}")
+
+    timestamps = _resolve_timestamps(
+        timestamps, audio, params.get("reference_id") is None
+    )
+    if timestamps is None or len(timestamps) == 0:
+        timestamps = np.empty((0, 2))
+    else:
+        timestamps = _validate_timestamps(timestamps)
+
+    params = {**_BATCH_PARAMS, **params}
+    _check_scoring(params["scoring"], params["hop_size"])
+    params["vad"] = _vad_settings(
+        params.pop("vad_aggressiveness"),
+        params.pop("vad_frame_ms"),
+        params.pop("min_speech_ratio"),
+    )
+    return audio, timestamps, params
+
+
+def _checked_segments(timestamps: np.ndarray, params: Dict) -> np.ndarray:
+    # With an enrolled reference every timestamp is checked, otherwise the
+    # first one is the reference
+    if params["reference_embedding"] is not None:
+        return timestamps
+    return timestamps[1:]
+
+
+def _thresholds(params: Dict) -> Dict:
+    return {
+        "threshold": params["threshold"],
+        "different_speaker_threshold": params["different_speaker_threshold"],
+        "report_skipped": params["vad"] is not None,
+    }
+
+
+def _queue_wait(submitted: float, timing: Dict) -> float:
+    # Time a task waited in the pool before a worker picked it up
+    return max(0.0, timing["started"] - submitted)
+
+
+class DoubleVoiceDetector:
     """
-    Detect if multiple speakers are present in specified audio segments.
+    Long-lived double voice detector that keeps its worker pool alive.
 
-    Args:
-        timestamps: 2D array of [start, end] time pairs in seconds
-        audio: Path to audio file to analyze
-        parallel: Whether to use parallel processing (default: True)
-        threshold: Similarity threshold for frame-level detection (default: 0.6)
-        different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+    The voice encoder is loaded once per process (once in the caller and once
+    in every pool worker) and reused across calls to detect(), so repeated
+    requests only pay for decoding and inference.
 
-    Returns:
-        Dictionary containing detection result and suspicious segments
+    Example:
+        with DoubleVoiceDetector() as detector:
+            result = detector.detect(timestamps, audio="recording.wav")
     """
 
-    if not timestamps:
-        return {"multiple_speakers_detected": "NO", "suspicious_segments": []}
+    def __init__(
+        self,
+        parallel: bool = True,
+        max_workers: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
+        references: Optional[ReferenceStore] = None,
+        metrics_callback: Optional[Callable[[Dict], None]] = None,
+        precision: str = "float32",
+        torch_threads: Optional[int] = None,
+        batcher: Optional[EncoderBatcher] = None,
+    ):
+        """
+        Args:
+            parallel: Whether to process segments in a worker pool (default: True)
+            max_workers: Number of pool workers (default: number of CPUs
+                available to the process, honouring affinity and cgroup quotas)
+            cache: Optional on-disk embedding cache shared across calls and processes
+            references: Optional store of enrolled reference voices for
+                reference_id, enrolled with the same precision
+            metrics_callback: Called with the diagnostics of every detect() call
+                and every recording of detect_batch()
+            precision: Encoder precision, "float32", "int8" (dynamically
+                quantized linear layer) or "bf16" on CPUs with native bf16
+                support (default: "float32")
+            torch_threads: Torch intra-op threads per worker process; when
+                given, the calling process is also set to it once, here,
+                since the setting is process-wide (default: planned per
+                request from the available CPUs, leaving the calling
+                process's setting alone)
+            batcher: Shared EncoderBatcher for segments analysed in this
+                process, so concurrent calls from several threads (and other
+                detectors or streams using the same batcher) share forward
+                passes; pool workers encode on their own, but
+                AsyncDoubleVoiceDetector analyses segments in this process
+                when a batcher is set
+        """
+        self.parallel = parallel
+        self.cache = cache
+        self.references = references
+        self.metrics_callback = metrics_callback
+        self.precision = _check_precision(precision)
+        self.cpus = available_cpus()
+        self.max_workers = max_workers or self.cpus
+        self.torch_threads = torch_threads
+        self.batcher = batcher
+        self._executor = None
 
-    if not isinstance(timestamps, (list, np.ndarray)):
-        raise TypeError("timestamps must be a list or numpy array")
+        # In-process inference, including a batcher's thread, uses the
+        # process-wide setting; it is only changed when asked for, and not
+        # per request, since concurrent detect() calls would interleave
+        # their changes
+        _set_torch_threads(torch_threads)
 
-    timestamps = np.array(timestamps)
-    if timestamps.ndim != 2 or timestamps.shape[1] != 2:
-        raise ValueError("timestamps must be a 2D array with shape (n, 2)")
+        if batcher is not None and batcher.precision != self.precision:
+            raise ValueError(
+                f"batcher precision {batcher.precision} does not match {self.precision}"
+            )
+        if references is not None and references.precision != self.precision:
+            raise ValueError(
+                f"reference store precision {references.precision} does not match "
+                f"{self.precision}"
+            )
+
+        if self.parallel:
+            # Workers attach to per-request shared memory; make them share the
+            # parent's resource tracker so it is not reported as leaked
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(
+                    self.precision,
+                    torch_threads or max(1, self.cpus // self.max_workers),
+                ),
+            )
+            # Start every worker now so the first request does not pay for
+            # process spawn and model loading
+            warm_up = [
+                self._executor.submit(_warm_up_worker) for _ in range(self.max_workers)
+            ]
+            for future in warm_up:
+                future.result()
+
+    def __enter__(self) -> "DoubleVoiceDetector":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
 
-    enc = VoiceEncoder()
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
-    # Extract reference from first timestamp
-    first_start, first_end = timestamps[0]
-    y_ref, sr_ref = librosa.load(audio, sr=None)
-    start_sample = int(first_start * sr_ref)
-    end_sample = int(first_end * sr_ref)
-    reference_segment = y_ref[start_sample:end_sample]
-    reference_wav = preprocess_wav(reference_segment, source_sr=sr_ref)
-    reference_embedding = enc.embed_utterance(reference_wav)
+    def detect(
+        self,
+        timestamps: List[List[float]],
+        audio: str,
+        threshold: float = 0.6,
+        different_speaker_threshold: float = 20.0,
+        window_size: float = 1.0,
+        hop_size: float = 0.5,
+        reference_id: Optional[str] = None,
+        vad_aggressiveness: Optional[int] = None,
+        vad_frame_ms: int = 30,
+        min_speech_ratio: float = 0.5,
+        return_diagnostics: bool = False,
+        scoring: str = "windows",
+    ) -> Dict:
+        """
+        Detect if multiple speakers are present in specified audio segments.
 
-    results = []
+        Args:
+            timestamps: 2D array of [start, end] time pairs in seconds, or
+                "auto" to use the speech turns of the recording, with the
+                cleanest long turn as reference
+            audio: Path to audio file to analyze
+            threshold: Similarity threshold for frame-level detection (default: 0.6)
+            different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+            window_size: Size of the analysis window in seconds (default: 1.0)
+            hop_size: Step size between windows in seconds (default: 0.5)
+            reference_id: Enrolled candidate to compare against; when set, every
+                timestamp is checked instead of using the first as reference
+            vad_aggressiveness: Enable VAD gating with this webrtcvad mode (0-3);
+                windows with too little speech are not embedded (default: None, off)
+            vad_frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+            min_speech_ratio: Fraction of speech frames a window needs to be embedded (default: 0.5)
+            return_diagnostics: Add per-request and per-segment timings under
+                "diagnostics" (default: False)
+            scoring: "windows" embeds every window_size window separately;
+                "partials" embeds each segment once and scores its 1.6 s
+                encoder partials every hop_size seconds, ignoring window_size
+                (default: "windows")
 
-    # Process remaining timestamps (skip first since it's the reference)
-    timestamps_to_check = timestamps[1:] if len(timestamps) > 1 else []
+        Returns:
+            Dictionary containing detection result and suspicious segments;
+            with VAD gating also the number of embedded and skipped frames
+        """
 
-    if parallel and len(timestamps_to_check) > 1:
-        with ProcessPoolExecutor() as executor:
-            futures = []
-            for i, (start_time, end_time) in enumerate(timestamps_to_check, start=1):
+        vad = _vad_settings(vad_aggressiveness, vad_frame_ms, min_speech_ratio)
+        _check_scoring(scoring, hop_size)
+
+        timestamps = _resolve_timestamps(timestamps, audio, reference_id is None)
+        if timestamps is None or len(timestamps) == 0:
+            return {"multiple_speakers_detected": "NO", "suspicious_segments": []}
+
+        trace = _Trace(audio)
+        results = self._similarities(
+            timestamps,
+            audio,
+            window_size,
+            hop_size,
+            reference_embedding=self._enrolled_reference(reference_id),
+            vad=vad,
+            trace=trace,
+            scoring=scoring,
+        )
+        summary = _summarize_results(
+            results,
+            threshold,
+            different_speaker_threshold,
+            report_skipped=vad is not None,
+        )
+        return self._report(summary, results, trace, return_diagnostics)
+
+    def frame_similarities(
+        self,
+        timestamps: List[List[float]],
+        audio: str,
+        window_size: float = 1.0,
+        hop_size: float = 0.5,
+        reference_id: Optional[str] = None,
+        vad_aggressiveness: Optional[int] = None,
+        vad_frame_ms: int = 30,
+        min_speech_ratio: float = 0.5,
+        scoring: str = "windows",
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Frame-level similarities to the reference for every checked segment.
+
+        The decision thresholds are not needed here, so one call can be scored
+        against any number of threshold settings.
+
+        Args:
+            timestamps: 2D array of [start, end] time pairs in seconds, first
+                is the reference, or "auto" as in detect()
+            audio: Path to audio file to analyze
+            window_size: Size of the analysis window in seconds (default: 1.0)
+            hop_size: Step size between windows in seconds (default: 0.5)
+            reference_id: Enrolled candidate to compare against instead of the first timestamp
+            vad_aggressiveness: Enable VAD gating with this webrtcvad mode (0-3);
+                windows with too little speech are not embedded (default: None, off)
+            vad_frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+            min_speech_ratio: Fraction of speech frames a window needs to be embedded (default: 0.5)
+            scoring: "windows" or "partials", as in detect() (default: "windows")
+
+        Returns:
+            One array of similarities per checked timestamp, or None for
+            segments that failed. Windows skipped by the VAD gate are NaN.
+        """
+        vad = _vad_settings(vad_aggressiveness, vad_frame_ms, min_speech_ratio)
+        _check_scoring(scoring, hop_size)
+
+        timestamps = _resolve_timestamps(timestamps, audio, reference_id is None)
+        if timestamps is None or len(timestamps) == 0:
+            return []
+
+        reference_embedding = self._enrolled_reference(reference_id)
+        n_checked = len(timestamps) - (1 if reference_embedding is None else 0)
+        frame_sims = [None] * n_checked
+        for index, _, _, sims, _ in self._similarities(
+            timestamps,
+            audio,
+            window_size,
+            hop_size,
+            reference_embedding=reference_embedding,
+            vad=vad,
+            scoring=scoring,
+        ):
+            frame_sims[index - 1] = sims
+        return frame_sims
+
+    def index_recording(
+        self,
+        audio: str,
+        hop_size: float = 0.5,
+        min_voiced_ratio: float = 0.5,
+        chunk_seconds: float = 60.0,
+    ) -> "RecordingIndex":
+        """
+        Embed a whole recording once for repeated timestamp queries.
+
+        Long recordings are split into chunks that run on the worker pool
+        when the execution plan calls for it.
+
+        Args:
+            audio: Path to audio file to index
+            hop_size: Time between 1.6 s partials in seconds, 0.01-1.6 (default: 0.5)
+            min_voiced_ratio: Fraction of voiced audio a partial needs to be
+                scored (default: 0.5)
+            chunk_seconds: Audio embedded per task in seconds (default: 60.0)
+
+        Returns:
+            RecordingIndex answering detect() and frame_similarities() for
+            any timestamps of the recording
+        """
+        from recording_index import RecordingIndex
+
+        return RecordingIndex.build(
+            audio,
+            hop_size=hop_size,
+            min_voiced_ratio=min_voiced_ratio,
+            chunk_seconds=chunk_seconds,
+            detector=self,
+        )
+
+    def _enrolled_reference(self, reference_id: Optional[str]) -> Optional[np.ndarray]:
+        if reference_id is None:
+            return None
+        if self.references is None:
+            raise ValueError("reference_id requires a detector with a ReferenceStore")
+        return self.references.get(reference_id)
+
+    def detect_batch(self, jobs: List[Tuple]) -> List[Dict]:
+        """
+        Detect multiple speakers in many recordings at once.
+
+        With a worker pool, the segments of all recordings share one work
+        queue: recordings are decoded inside the workers and each one's
+        segments are queued longest first, so short and long files keep all
+        cores busy together. A failing recording only affects its own result.
+
+        Args:
+            jobs: List of (audio, timestamps) or (audio, timestamps, params)
+                tuples, where timestamps may be "auto" and params is a dict
+                with any of threshold, different_speaker_threshold,
+                window_size, hop_size, scoring, return_diagnostics,
+                reference_id and the VAD options of detect()
+
+        Returns:
+            One result dictionary per job in input order, as returned by
+            detect(), or {"error": message} for recordings that failed
+        """
+        outputs = [None] * len(jobs)
+        prepared = []
+        for j, job in enumerate(jobs):
+            try:
+                audio, timestamps, params = _normalize_job(job)
+                params["reference_embedding"] = self._enrolled_reference(
+                    params.pop("reference_id")
+                )
+                prepared.append((j, audio, timestamps, params))
+            except Exception as e:
+                warnings.warn(f"Invalid batch job {j}: {e}")
+                outputs[j] = {"error": str(e)}
+
+        if self._executor is None:
+            for j, audio, timestamps, params in prepared:
+                try:
+                    results = []
+                    trace = _Trace(audio)
+                    if len(_checked_segments(timestamps, params)):
+                        results = self._similarities(
+                            timestamps,
+                            audio,
+                            params["window_size"],
+                            params["hop_size"],
+                            reference_embedding=params["reference_embedding"],
+                            vad=params["vad"],
+                            trace=trace,
+                            scoring=params["scoring"],
+                        )
+                    summary = _summarize_results(results, **_thresholds(params))
+                    outputs[j] = self._report(
+                        summary, results, trace, params["return_diagnostics"]
+                    )
+                except Exception as e:
+                    warnings.warn(f"Error processing {audio}: {e}")
+                    outputs[j] = {"error": str(e)}
+            return outputs
+
+        self._detect_batch_parallel(prepared, outputs)
+        return outputs
+
+    def _detect_batch_parallel(self, prepared: List[Tuple], outputs: List) -> None:
+        # Largest recordings are opened first, and only a bounded number of
+        # decoded recordings are kept in shared memory at any time
+        def total_duration(item):
+            segments = _checked_segments(item[2], item[3])
+            return float(np.sum(segments[:, 1] - segments[:, 0]))
+
+        queue = sorted(prepared, key=total_duration, reverse=True)
+        max_open = 2 * self.max_workers
+        # One plan for the whole batch, since all segments share the pool;
+        # batches always use the pool, however little audio they hold
+        plan = self._plan(
+            [
+                float(end - start)
+                for item in prepared
+                for start, end in _checked_segments(item[2], item[3])
+            ],
+            min((item[3]["hop_size"] for item in prepared), default=0.5),
+            min_parallel_seconds=0.0,
+        )
+        states = {}
+        in_flight = {}
+        submitted = {}
+
+        def finish(j):
+            state = states.pop(j)
+            if state.get("shm_name") is not None:
+                _release_shared_audio(state["shm_name"])
+            if "error" in state:
+                outputs[j] = {"error": state["error"]}
+            else:
+                state["results"].sort(key=lambda x: x[0])
+                summary = _summarize_results(
+                    state["results"], **_thresholds(state["params"])
+                )
+                outputs[j] = self._report(
+                    summary,
+                    state["results"],
+                    state["trace"],
+                    state["params"]["return_diagnostics"],
+                )
+
+        def open_recordings():
+            while queue and len(states) < max_open:
+                j, audio, timestamps, params = queue.pop(0)
+                segments = _checked_segments(timestamps, params)
+                if len(segments) == 0:
+                    # Nothing to check besides the reference
+                    summary = _summarize_results([], **_thresholds(params))
+                    outputs[j] = self._report(
+                        summary, [], _Trace(audio), params["return_diagnostics"]
+                    )
+                    continue
+
+                try:
+                    reference_embedding, reference_key, cached, cache_keys = (
+                        self._lookup_cache(
+                            audio,
+                            timestamps,
+                            params["window_size"],
+                            params["hop_size"],
+                            with_reference=params["reference_embedding"] is None,
+                            vad=params["vad"],
+                            scoring=params["scoring"],
+                        )
+                    )
+                except Exception as e:
+                    warnings.warn(f"Error processing {audio}: {e}")
+                    outputs[j] = {"error": str(e)}
+                    continue
+                if params["reference_embedding"] is not None:
+                    reference_embedding = params["reference_embedding"]
+
+                state = {
+                    "audio": audio,
+                    "timestamps": timestamps,
+                    "segments": segments,
+                    "params": params,
+                    "cache_keys": cache_keys,
+                    "results": [],
+                    "remaining": 0,
+                    "trace": _Trace(audio),
+                    "reference_embedding": reference_embedding,
+                }
+                state["trace"].plan = plan
+                states[j] = state
+
+                pending = [i for i in range(1, len(segments) + 1) if i not in cached]
+                for i in cached:
+                    state["trace"].segment(i, cached=True)
+                if reference_embedding is not None:
+                    for i, frame_embeddings in cached.items():
+                        start_time, end_time = segments[i - 1]
+                        state["results"].append(
+                            (
+                                i,
+                                float(start_time),
+                                float(end_time),
+                                frame_embeddings @ reference_embedding,
+                                None,
+                            )
+                        )
+                    if not pending:
+                        finish(j)
+                        continue
+                elif cached:
+                    # Score the cached segments once the reference is known
+                    state["cached"] = cached
+
+                spans = [
+                    (i, float(segments[i - 1][0]), float(segments[i - 1][1]))
+                    for i in pending
+                ]
+                # A cached reference is not decoded and embedded again
+                reference_start = reference_end = None
+                if reference_embedding is None:
+                    reference_start, reference_end = map(float, timestamps[0])
                 args = (
-                    i,
-                    float(start_time),
-                    float(end_time),
                     audio,
+                    reference_start,
+                    reference_end,
+                    self.cache,
+                    reference_key,
+                    spans,
+                    self.precision,
+                    plan["torch_threads"],
+                )
+                future = self._executor.submit(_prepare_recording, args)
+                in_flight[future] = ("prepare", j)
+
+        def submit_segments(j, shm_name, layout, failed, reference_embedding, timing):
+            state = states[j]
+            state["shm_name"] = shm_name
+            state["results"].extend(failed)
+            trace = state["trace"]
+            trace.reference_time = timing["reference_time"]
+            for i, decode_time in timing["decode_times"].items():
+                trace.segment(i, decode_time=decode_time)
+            segments = state["segments"]
+            params = state["params"]
+
+            for i, frame_embeddings in state.pop("cached", {}).items():
+                start_time, end_time = segments[i - 1]
+                state["results"].append(
+                    (
+                        i,
+                        float(start_time),
+                        float(end_time),
+                        frame_embeddings @ reference_embedding,
+                        None,
+                    )
+                )
+
+            # Longest segments first so they do not end up last in the queue
+            pending = sorted(layout, key=lambda i: layout[i][1], reverse=True)
+            for i in pending:
+                args = (
+                    i,
+                    float(segments[i - 1][0]),
+                    float(segments[i - 1][1]),
+                    shm_name,
+                    *layout[i],
+                    reference_embedding,
+                    16000,
+                    params["window_size"],
+                    params["hop_size"],
+                    self.cache,
+                    state["cache_keys"].get(i),
+                    params["vad"],
+                    self.precision,
+                    plan["torch_threads"],
+                    params["scoring"],
+                )
+                future = self._executor.submit(_process_single_timestamp, args)
+                in_flight[future] = ("segment", j)
+                submitted[future] = time.time()
+            state["remaining"] = len(pending)
+
+        def give_up(j, kind):
+            # A task ran past its timeout: the recording reports an error and
+            # its other tasks are dropped; worker processes cannot be stopped
+            for future, (other_kind, k) in list(in_flight.items()):
+                if k == j:
+                    del in_flight[future]
+                    submitted.pop(future, None)
+                    running.pop(future, None)
+                    if not future.cancel() and other_kind == "prepare":
+                        future.add_done_callback(_release_prepared)
+            state = states[j]
+            message = f"{kind} task timed out after {_TASK_TIMEOUT} s"
+            warnings.warn(f"Error processing {state['audio']}: {message}")
+            state["error"] = message
+            finish(j)
+
+        # When each task was first seen running, for the per-task timeout
+        running = {}
+        try:
+            open_recordings()
+            while in_flight:
+                done, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in done:
+                    running.pop(future, None)
+                    kind, j = in_flight.pop(future)
+                    state = states[j]
+
+                    if kind == "prepare":
+                        try:
+                            shm_name, layout, failed, reference_embedding, timing = (
+                                future.result()
+                            )
+                        except Exception as e:
+                            warnings.warn(f"Error processing {state['audio']}: {e}")
+                            state["error"] = str(e)
+                            finish(j)
+                            continue
+                        if reference_embedding is None:
+                            reference_embedding = state["reference_embedding"]
+                        submit_segments(
+                            j, shm_name, layout, failed, reference_embedding, timing
+                        )
+                    else:
+                        try:
+                            result, timing = future.result()
+                            state["results"].append(result)
+                            state["trace"].segment(
+                                result[0],
+                                worker=timing["worker"],
+                                queue_wait=_queue_wait(submitted.pop(future), timing),
+                                analysis_time=timing["analysis_time"],
+                            )
+                        except Exception as e:
+                            warnings.warn(f"Segment processing failed: {e}")
+                        state["remaining"] -= 1
+
+                    if state["remaining"] == 0:
+                        finish(j)
+
+                for future in list(in_flight):
+                    if future not in in_flight or not future.running():
+                        continue
+                    if now - running.setdefault(future, now) > _TASK_TIMEOUT:
+                        kind, j = in_flight[future]
+                        give_up(j, kind)
+
+                open_recordings()
+        finally:
+            # An exception escaped: free the audio of recordings still open
+            for future, (kind, _) in in_flight.items():
+                if not future.cancel() and kind == "prepare":
+                    future.add_done_callback(_release_prepared)
+            for state in states.values():
+                if state.get("shm_name") is not None:
+                    _release_shared_audio(state["shm_name"])
+
+    def _report(
+        self,
+        summary: Dict,
+        results: List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]],
+        trace: _Trace,
+        return_diagnostics: bool,
+    ) -> Dict:
+        # Hand the request's diagnostics to the metrics callback and, when
+        # asked for, to the caller
+        if self.metrics_callback is None and not return_diagnostics:
+            return summary
+
+        diagnostics = trace.report(results)
+        if self.metrics_callback is not None:
+            try:
+                self.metrics_callback(diagnostics)
+            except Exception as e:
+                warnings.warn(f"metrics_callback failed: {e}")
+        if return_diagnostics:
+            summary["diagnostics"] = diagnostics
+        return summary
+
+    def _similarities(
+        self,
+        timestamps: List[List[float]],
+        audio: str,
+        window_size: float,
+        hop_size: float,
+        reference_embedding: Optional[np.ndarray] = None,
+        vad: Optional[Tuple[int, int, float]] = None,
+        trace: Optional[_Trace] = None,
+        scoring: str = "windows",
+    ) -> List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]]:
+        timestamps = _validate_timestamps(timestamps)
+        if trace is None:
+            trace = _Trace(audio)
+
+        if reference_embedding is None:
+            # Process remaining timestamps (skip first since it's the reference)
+            timestamps_to_check = timestamps[1:] if len(timestamps) > 1 else []
+            first_start, first_end = timestamps[0]
+        else:
+            # Enrolled reference: every timestamp is checked
+            timestamps_to_check = timestamps
+
+        results = []
+        cached_reference, reference_key, cached_embeddings, cache_keys = (
+            self._lookup_cache(
+                audio,
+                timestamps,
+                window_size,
+                hop_size,
+                with_reference=reference_embedding is None,
+                vad=vad,
+                scoring=scoring,
+            )
+        )
+        if reference_embedding is None:
+            reference_embedding = cached_reference
+
+        pending = [
+            (i, float(start_time), float(end_time))
+            for i, (start_time, end_time) in enumerate(timestamps_to_check, start=1)
+            if i not in cached_embeddings
+        ]
+        plan = self._plan([end - start for _, start, end in pending], hop_size)
+        trace.plan = plan
+
+        y = None
+        if reference_embedding is None or pending:
+            # Only the reference and the pending segments are decoded
+            y = AudioReader(audio, sample_rate=16000)
+
+        try:
+            if reference_embedding is None:
+                # Extract reference from first timestamp
+                t = time.perf_counter()
+                reference_embedding = _reference_embedding(
+                    y, first_start, first_end, precision=self.precision
+                )
+                if self.cache is not None:
+                    self.cache.put(reference_key, reference_embedding)
+                trace.reference_time = time.perf_counter() - t
+
+            # Cache hits only need the similarity step
+            for i, frame_embeddings in cached_embeddings.items():
+                trace.segment(i, cached=True)
+                start_time, end_time = timestamps_to_check[i - 1]
+                frame_sims = frame_embeddings @ reference_embedding
+                results.append(
+                    (i, float(start_time), float(end_time), frame_sims, None)
+                )
+
+            if plan["parallel"]:
+                parallel_results = self._analyze_parallel(
+                    y,
+                    pending,
+                    reference_embedding,
+                    window_size,
+                    hop_size,
+                    cache_keys,
+                    vad,
+                    trace,
+                    plan["torch_threads"],
+                    scoring,
+                )
+                results.extend(parallel_results)
+            else:
+                for i, start_time, end_time in pending:
+                    t = time.perf_counter()
+                    try:
+                        start_sample, end_sample = _segment_bounds(
+                            start_time, end_time, len(y), 16000
+                        )
+                    except ValueError as e:
+                        results.append(_failed_segment(i, start_time, end_time, e))
+                        continue
+                    segment = y[start_sample:end_sample]
+                    decode_time = time.perf_counter() - t
+
+                    t = time.perf_counter()
+                    result = _analyze_segment(
+                        i,
+                        start_time,
+                        end_time,
+                        segment,
+                        reference_embedding,
+                        16000,
+                        window_size,
+                        hop_size,
+                        cache=self.cache,
+                        cache_key=cache_keys.get(i),
+                        vad=vad,
+                        precision=self.precision,
+                        batcher=self.batcher,
+                        scoring=scoring,
+                    )
+                    trace.segment(
+                        i,
+                        worker=os.getpid(),
+                        decode_time=decode_time,
+                        analysis_time=time.perf_counter() - t,
+                    )
+                    results.append(result)
+        finally:
+            if y is not None:
+                y.close()
+
+        results.sort(key=lambda x: x[0])
+        return results
+
+    def _analyze_parallel(
+        self,
+        y: AudioReader,
+        pending: List[Tuple[int, float, float]],
+        reference_embedding: np.ndarray,
+        window_size: float,
+        hop_size: float,
+        cache_keys: Dict,
+        vad: Optional[Tuple[int, int, float]],
+        trace: _Trace,
+        torch_threads: int,
+        scoring: str = "windows",
+    ) -> List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]]:
+        shm_name, layout, results, decode_times = _pack_segments(y, pending)
+        for i, decode_time in decode_times.items():
+            trace.segment(i, decode_time=decode_time)
+        try:
+            submitted = {}
+            for i, start_time, end_time in pending:
+                if i not in layout:
+                    continue
+                args = (
+                    i,
+                    start_time,
+                    end_time,
+                    shm_name,
+                    *layout[i],
                     reference_embedding,
                     16000,
                     window_size,
                     hop_size,
-                    threshold,
-                    different_speaker_threshold,
+                    self.cache,
+                    cache_keys.get(i),
+                    vad,
+                    self.precision,
+                    torch_threads,
+                    scoring,
                 )
-                future = executor.submit(_process_single_timestamp, args)
-                futures.append(future)
+                future = self._executor.submit(_process_single_timestamp, args)
+                submitted[future] = time.time()
 
-            for future in as_completed(futures):
+            for future in as_completed(submitted):
                 try:
-                    result = future.result(timeout=60)  # Timeout in seconds
+                    result, timing = future.result(timeout=_TASK_TIMEOUT)
                     results.append(result)
+                    trace.segment(
+                        result[0],
+                        worker=timing["worker"],
+                        queue_wait=_queue_wait(submitted[future], timing),
+                        analysis_time=timing["analysis_time"],
+                    )
                 except Exception as e:
                     warnings.warn(f"Segment processing timed out or failed: {e}")
+        finally:
+            _release_shared_audio(shm_name)
+        return results
 
-        results.sort(key=lambda x: x[0])
-    else:
-        for i, (start_time, end_time) in enumerate(timestamps_to_check, start=1):
-            args = (
-                i,
-                float(start_time),
-                float(end_time),
-                audio,
-                reference_embedding,
-                16000,
+    def _plan(self, segment_seconds: List[float], hop_size: float, **kwargs) -> Dict:
+        # Workers and torch threads for one request; without a pool the
+        # segments run in this process with all of the CPUs
+        return plan_execution(
+            segment_seconds,
+            hop_size,
+            cpus=self.cpus,
+            max_workers=self.max_workers if self._executor is not None else 1,
+            torch_threads=self.torch_threads,
+            **kwargs,
+        )
+
+    def _lookup_cache(
+        self,
+        audio: str,
+        timestamps: np.ndarray,
+        window_size: float,
+        hop_size: float,
+        with_reference: bool = True,
+        vad: Optional[Tuple[int, int, float]] = None,
+        scoring: str = "windows",
+    ) -> Tuple[Optional[np.ndarray], Optional[str], Dict, Dict]:
+        # Reference embedding and the frame embeddings already on disk, by
+        # 1-based segment index. With with_reference the first timestamp is
+        # the reference, otherwise every timestamp is a segment to check.
+        if self.cache is None:
+            return None, None, {}, {}
+
+        digest = self.cache.file_digest(audio)
+        # Embeddings of other precisions, VAD settings and scoring modes are
+        # kept apart; float32 windows without VAD keep the plain keys
+        precision = "" if self.precision == "float32" else f"precision={self.precision}"
+        variant = precision if vad is None else f"vad={vad}{precision}"
+        if scoring != "windows":
+            variant = f"scoring={scoring}{variant}"
+        reference_key = None
+        reference_embedding = None
+        segments = timestamps
+        if with_reference:
+            first_start, first_end = timestamps[0]
+            reference_key = self.cache.key(
+                digest, first_start, first_end, variant=precision
+            )
+            reference_embedding = self.cache.get(reference_key)
+            segments = timestamps[1:]
+
+        cached_embeddings = {}
+        cache_keys = {}
+        for i, (start_time, end_time) in enumerate(segments, start=1):
+            cache_keys[i] = self.cache.key(
+                digest,
+                start_time,
+                end_time,
                 window_size,
                 hop_size,
-                threshold,
-                different_speaker_threshold,
+                variant=variant,
             )
-            result = _process_single_timestamp(args)
-            results.append(result)
+            frame_embeddings = self.cache.get(cache_keys[i])
+            if frame_embeddings is not None:
+                cached_embeddings[i] = frame_embeddings
 
-    suspicious_segments = []
-    for index, start_time, end_time, analysis in results:
-        if analysis.get("has_multiple_speakers", False):
-            suspicious_segments.append([start_time, end_time])
+        return reference_embedding, reference_key, cached_embeddings, cache_keys
 
-    detection_result = "YES" if suspicious_segments else "NO"
 
-    print(f"Multiple speakers detected: {detection_result}")
-    if detection_result == "YES":
-        for seg in suspicious_segments:
-            print(f"  [{seg[0]:.1f}s - {seg[1]:.1f}s]")
+def detect_double_voice(
+    timestamps: List[List[float]],
+    audio: str,
+    parallel: bool = True,
+    threshold: float = 0.6,
+    different_speaker_threshold: float = 20.0,
+    window_size: float = 1.0,
+    hop_size: float = 0.5,
+    cache: Optional[EmbeddingCache] = None,
+    references: Optional[ReferenceStore] = None,
+    reference_id: Optional[str] = None,
+    vad_aggressiveness: Optional[int] = None,
+    vad_frame_ms: int = 30,
+    min_speech_ratio: float = 0.5,
+    return_diagnostics: bool = False,
+    precision: str = "float32",
+    max_workers: Optional[int] = None,
+    torch_threads: Optional[int] = None,
+    scoring: str = "windows",
+) -> Dict:
+    """
+    Detect if multiple speakers are present in specified audio segments.
 
-    return {
-        "multiple_speakers_detected": detection_result,
-        "suspicious_segments": suspicious_segments,
-    }
+    One-shot wrapper around DoubleVoiceDetector; keep a detector alive instead
+    when running many detections.
+
+    Args:
+        timestamps: 2D array of [start, end] time pairs in seconds, or "auto"
+            to use the speech turns of the recording (see speech_turns.py)
+        audio: Path to audio file to analyze
+        parallel: Whether to use parallel processing (default: True)
+        threshold: Similarity threshold for frame-level detection (default: 0.6)
+        different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+        cache: Optional on-disk embedding cache; with a warm cache only the similarity step runs
+        references: Store of enrolled reference voices, required with reference_id
+        reference_id: Enrolled candidate to compare against; when set, every
+            timestamp is checked instead of using the first as reference
+        vad_aggressiveness: Enable VAD gating with this webrtcvad mode (0-3);
+            windows with too little speech are not embedded (default: None, off)
+        vad_frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+        min_speech_ratio: Fraction of speech frames a window needs to be embedded (default: 0.5)
+        return_diagnostics: Add per-request and per-segment timings under
+            "diagnostics" (default: False)
+        precision: Encoder precision, "float32", "int8" or "bf16" (default: "float32")
+        max_workers: Upper bound on worker processes (default: number of CPUs
+            available to the process)
+        torch_threads: Torch intra-op threads per worker process (default:
+            planned from the available CPUs)
+        scoring: "windows" embeds every window separately; "partials" embeds
+            each segment once and scores its 1.6 s encoder partials every
+            hop_size seconds (default: "windows")
+
+    Returns:
+        Dictionary containing detection result and suspicious segments
+    """
+
+    # Only start a pool, sized to the request, when the planner finds
+    # enough work to spread over processes
+    timestamps = _resolve_timestamps(timestamps, audio, reference_id is None)
+    checked = []
+    if timestamps is not None and len(timestamps) > 0:
+        checked = _validate_timestamps(timestamps)
+        if reference_id is None:
+            checked = checked[1:]
+    plan = plan_execution(
+        [float(end - start) for start, end in checked],
+        hop_size,
+        max_workers=max_workers,
+        torch_threads=torch_threads,
+    )
+
+    with DoubleVoiceDetector(
+        parallel=parallel and plan["parallel"],
+        max_workers=plan["workers"],
+        cache=cache,
+        references=references,
+        precision=precision,
+        torch_threads=torch_threads,
+    ) as detector:
+        return detector.detect(
+            timestamps,
+            audio,
+            threshold=threshold,
+            different_speaker_threshold=different_speaker_threshold,
+            window_size=window_size,
+            hop_size=hop_size,
+            reference_id=reference_id,
+            vad_aggressiveness=vad_aggressiveness,
+            vad_frame_ms=vad_frame_ms,
+            min_speech_ratio=min_speech_ratio,
+            return_diagnostics=return_diagnostics,
+            scoring=scoring,
+        )
+
+
+def detect_double_voice_batch(
+    jobs: List[Tuple],
+    parallel: bool = True,
+    max_workers: Optional[int] = None,
+    cache: Optional[EmbeddingCache] = None,
+    precision: str = "float32",
+    references: Optional[ReferenceStore] = None,
+) -> List[Dict]:
+    """
+    Detect multiple speakers in many recordings with one shared worker pool.
+
+    Args:
+        jobs: List of (audio, timestamps) or (audio, timestamps, params) tuples,
+            where params is a dict with any of threshold,
+            different_speaker_threshold, window_size, hop_size, scoring,
+            reference_id and the VAD options of detect_double_voice
+        parallel: Whether to use parallel processing (default: True)
+        max_workers: Number of pool workers (default: number of CPUs
+            available to the process)
+        cache: Optional on-disk embedding cache
+        precision: Encoder precision, "float32", "int8" or "bf16" (default: "float32")
+        references: Store of enrolled reference voices, required when a job
+            passes reference_id
+
+    Returns:
+        One result dictionary per job in input order, or {"error": message}
+        for recordings that failed
+    """
+    with DoubleVoiceDetector(
+        parallel=parallel,
+        max_workers=max_workers,
+        cache=cache,
+        references=references,
+        precision=precision,
+    ) as detector:
+        return detector.detect_batch(jobs)
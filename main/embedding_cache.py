@@ -0,0 +1,188 @@
+"""
+Persistent Embedding Cache for Double Voice Detection
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import importlib.metadata
+import numpy as np
+from typing import Optional
+
+# Bump when preprocessing or framing changes so stale embeddings are not reused
+_CACHE_FORMAT = 2
+
+# Estimated size of every cache directory in this process. Pickled copies of
+# a cache sent to the same pool worker share it, so only the first write in
+# each worker scans the directory instead of the first write of every task.
+_sizes = {}
+
+# Writes after which the estimate is refreshed from disk, to account for
+# entries written and evicted by other processes
+_RESCAN_PUTS = 256
+
+
+def _model_version() -> str:
+    try:
+        version = importlib.metadata.version("resemblyzer")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"resemblyzer-{version}/format-{_CACHE_FORMAT}"
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of per-window embeddings shared by all processes on a host.
+
+    Entries are stored as one .npy file each, keyed by the audio content hash,
+    segment bounds, window parameters and model version. Writes are atomic
+    (temporary file + rename) so concurrent readers and writers never see a
+    partial entry. When the directory grows past `max_bytes`, the least
+    recently used entries are evicted.
+
+    Example:
+        cache = EmbeddingCache("~/.cache/double_voice", max_bytes=2 * 1024**3)
+        result = detect_double_voice(timestamps, audio=path, cache=cache)
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024**3):
+        """
+        Args:
+            directory: Directory holding the cache entries, created if missing
+            max_bytes: Size limit before least recently used entries are evicted (default: 1 GiB)
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.model_version = _model_version()
+        os.makedirs(self.directory, exist_ok=True)
+        self._digests = {}
+
+    def __getstate__(self):
+        # Sent to pool workers with every task; keep the payload small
+        state = self.__dict__.copy()
+        state["_digests"] = {}
+        return state
+
+    def file_digest(self, path: str) -> str:
+        """Content hash of an audio file, memoized by path, size and mtime."""
+        stat = os.stat(path)
+        memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=20)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            digest = h.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key(
+        self,
+        digest: str,
+        start_time: float,
+        end_time: float,
+        window_size: Optional[float] = None,
+        hop_size: Optional[float] = None,
+        variant: str = "",
+    ) -> str:
+        """
+        Build the cache key of one segment.
+
+        Leave `window_size` and `hop_size` unset for an utterance-level
+        (reference) embedding.
+        """
+        fields = [
+            digest,
+            float(start_time),
+            float(end_time),
+            window_size,
+            hop_size,
+            self.model_version,
+            variant,
+        ]
+        return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached embeddings for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            embeddings = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return embeddings
+
+    def put(self, key: str, embeddings: np.ndarray) -> None:
+        """Store embeddings under `key`, evicting old entries if needed."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        size = _sizes.get(self.directory)
+        if size is None or size[1] >= _RESCAN_PUTS:
+            size = _sizes[self.directory] = [self._scan()[1], 0]
+        else:
+            size[0] += os.path.getsize(path)
+            size[1] += 1
+        if size[0] > self.max_bytes:
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove every cache entry."""
+        for _, _, path in self._scan()[0]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _sizes[self.directory] = [0, 0]
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Evicted by another process in the meantime
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def _evict(self) -> None:
+        # Drop the least recently used entries down to 90% of the limit so
+        # eviction does not run again on the very next write
+        entries, total = self._scan()
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        _sizes[self.directory] = [total, 0]
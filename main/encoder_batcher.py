@@ -0,0 +1,199 @@
+"""
+Dynamic Micro-Batching of Voice Encoder Forward Passes
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+import numpy as np
+import torch
+
+
+class EncoderBatcher:
+    """
+    Shared voice encoder that merges concurrent forward passes into batches.
+
+    Callers on any thread hand in the mel partials of one request and block
+    until their embeddings are ready. A single inference thread collects the
+    partials of all waiting requests and runs them through the encoder in one
+    batch as soon as `max_batch_size` partials are waiting or the oldest has
+    waited `max_wait` seconds, then routes each slice of the output back to
+    its caller. Many small requests (short segments, live streams) then fill
+    the LSTM instead of each running a tiny batch of its own, at a latency
+    cost of at most `max_wait`.
+
+    Example:
+        batcher = EncoderBatcher(max_batch_size=256, max_wait=0.01)
+        detector = DoubleVoiceDetector(parallel=False, batcher=batcher)
+        streams = [DoubleVoiceStream(ref, batcher=batcher) for ref in references]
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 256,
+        max_wait: float = 0.01,
+        precision: str = "float32",
+    ):
+        """
+        Args:
+            max_batch_size: Partials (1.6 s mel slices) per forward pass before
+                a batch is run without waiting further (default: 256)
+            max_wait: Longest time in seconds a request waits for others to
+                join its batch (default: 0.01)
+            precision: Encoder precision, "float32", "int8" or "bf16" (default: "float32")
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait < 0:
+            raise ValueError("max_wait must not be negative")
+
+        from double_voice import _check_precision
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.precision = _check_precision(precision)
+        self._queue = queue.Queue()
+        # Guards _closed so no request is queued behind the stop sentinel
+        self._lock = threading.Lock()
+        self._closed = False
+        self._error = None
+        self._batches = 0
+        self._requests = 0
+        self._partials = 0
+        self._thread = threading.Thread(
+            target=self._run, name="encoder-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "EncoderBatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def encode(self, mels: np.ndarray) -> np.ndarray:
+        """
+        Encoder output for a stack of mel partials, batched with other callers.
+
+        Args:
+            mels: (n_partials, frames, n_mels) float32 mel slices
+
+        Returns:
+            (n_partials, embedding_size) partial embeddings, not averaged or normalized
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("EncoderBatcher is closed") from self._error
+            self._queue.put((mels, future))
+        return future.result()
+
+    def close(self) -> None:
+        """Run the batches already queued and stop the inference thread."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict:
+        """
+        Batching counters since the batcher started.
+
+        Returns:
+            Dictionary with the number of batches, requests and partials and
+            the mean partials and requests per batch
+        """
+        batches = max(self._batches, 1)
+        return {
+            "batches": self._batches,
+            "requests": self._requests,
+            "partials": self._partials,
+            "mean_batch_size": self._partials / batches,
+            "mean_requests_per_batch": self._requests / batches,
+        }
+
+    def _run(self) -> None:
+        # However the inference thread ends, fail every request it has not
+        # answered so that no caller blocks forever
+        pending = []
+        try:
+            self._serve(pending)
+            error = RuntimeError("EncoderBatcher is closed")
+        except BaseException as e:
+            error = e
+            self._error = e
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                pending.append(item)
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _serve(self, pending: List[Tuple[np.ndarray, Future]]) -> None:
+        # Requests taken off the queue stay in `pending` until answered
+        from double_voice import _get_encoder
+
+        enc = _get_encoder(self.precision)
+        while True:
+            if not pending:
+                item = self._queue.get()
+                if item is None:
+                    return
+                pending.append(item)
+
+            size = 1
+            rows = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while rows < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = (
+                        self._queue.get(timeout=timeout)
+                        if timeout > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+                if rows + len(item[0]) > self.max_batch_size:
+                    # Starts the next batch; a single oversized request runs alone
+                    break
+                size += 1
+                rows += len(item[0])
+
+            self._forward(enc, pending[:size])
+            del pending[:size]
+            if stop:
+                return
+
+    def _forward(self, enc, batch: List[Tuple[np.ndarray, Future]]) -> None:
+        try:
+            mels = np.concatenate([mels for mels, _ in batch])
+            with torch.no_grad():
+                partial_embeds = (
+                    enc(torch.from_numpy(mels).to(enc.device)).cpu().numpy()
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._requests += len(batch)
+        self._partials += len(mels)
+        bounds = np.cumsum([len(mels) for mels, _ in batch])[:-1]
+        for (_, future), embeds in zip(batch, np.split(partial_embeds, bounds)):
+            future.set_result(embeds)
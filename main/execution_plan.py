@@ -0,0 +1,130 @@
+"""
+Execution Planning for Worker Processes and Torch Threads
+"""
+
+import math
+import os
+from typing import Dict, List, Optional
+
+# Below this much audio per request the pool's IPC overhead outweighs its gain
+MIN_PARALLEL_SECONDS = 15.0
+
+# Encoder batch rows (partials) worth one intra-op thread; fewer rows per
+# thread only adds synchronisation
+ROWS_PER_THREAD = 8
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process may use.
+
+    Honours the CPU affinity mask and cgroup (v1 and v2) CPU quotas, so a
+    container limited to 4 CPUs on a 32-core node reports 4, not 32.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def plan_execution(
+    segment_seconds: List[float],
+    hop_size: float = 0.5,
+    cpus: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    torch_threads: Optional[int] = None,
+    min_parallel_seconds: float = MIN_PARALLEL_SECONDS,
+) -> Dict:
+    """
+    Choose the number of worker processes and torch threads for one request.
+
+    Segments are spread over up to one process per CPU, and the CPUs are then
+    divided between the processes as intra-op threads, so processes x threads
+    never exceeds the available CPUs. Small requests stay in one process, and
+    threads are capped by how many encoder rows each segment gives them.
+
+    Args:
+        segment_seconds: Length of every segment to embed in seconds
+        hop_size: Step size between windows in seconds (default: 0.5)
+        cpus: CPUs to plan for (default: available_cpus())
+        max_workers: Upper bound on worker processes, e.g. the size of an
+            existing pool (default: cpus)
+        torch_threads: Explicit torch threads per process (default: CPUs
+            divided between the worker processes)
+        min_parallel_seconds: Total audio below which everything runs in one
+            process (default: MIN_PARALLEL_SECONDS)
+
+    Returns:
+        Dictionary with cpus, workers, torch_threads and parallel
+    """
+    cpus = cpus or available_cpus()
+    n_segments = len(segment_seconds)
+    total_seconds = float(sum(segment_seconds))
+
+    if n_segments <= 1 or total_seconds < min_parallel_seconds:
+        workers = 1
+    else:
+        workers = max(1, min(max_workers or cpus, n_segments))
+
+    if torch_threads is None:
+        torch_threads = max(1, cpus // workers)
+        if n_segments:
+            # ~2.3 partials per window (rate 1.3 over 1.6 s partials)
+            rows = (max(segment_seconds) / max(hop_size, 1e-3)) * 2.3
+            torch_threads = min(
+                torch_threads, max(1, math.ceil(rows / ROWS_PER_THREAD))
+            )
+
+    return {
+        "cpus": cpus,
+        "workers": workers,
+        "torch_threads": int(torch_threads),
+        "parallel": workers > 1,
+    }
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    # cgroup v2: "<quota> <period>" or "max <period>" in cpu.max
+    for path in _cgroup_v2_paths():
+        try:
+            with open(path) as f:
+                quota, period = f.read().split()[:2]
+        except (OSError, ValueError):
+            continue
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+
+    # cgroup v1: cpu.cfs_quota_us is -1 when unlimited
+    for directory in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us")) as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            continue
+        if quota <= 0 or period <= 0:
+            return None
+        return quota / period
+    return None
+
+
+def _cgroup_v2_paths() -> List[str]:
+    paths = []
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    group = line.strip()[3:].lstrip("/")
+                    if group:
+                        paths.append(os.path.join("/sys/fs/cgroup", group, "cpu.max"))
+    except OSError:
+        pass
+    paths.append("/sys/fs/cgroup/cpu.max")
+    return paths
@@ -0,0 +1,189 @@
+"""
+Accuracy Drift Report for Reduced-Precision Encoders
+
+Runs the labelled files in ./assets with the float32 encoder and with each
+reduced precision, and reports how far the similarities and the detection
+scores move:
+
+    python precision_report.py
+    python precision_report.py --precision int8 --output drift.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from double_voice import DoubleVoiceDetector
+from grid_search import (
+    DATASET_FOLDER,
+    GROUND_TRUTH,
+    classification_metrics,
+    generate_timestamps,
+    get_audio_duration,
+    sweep_thresholds,
+)
+
+
+def collect_similarities(detector, files, window_size=1.0, hop_size=0.5):
+    """
+    Frame similarities of every file and the total processing time.
+
+    Returns:
+        Tuple of (list with one list of per-segment arrays per file, seconds)
+    """
+    similarities = []
+    elapsed = 0.0
+    for path, duration in files:
+        timestamps = generate_timestamps(duration)
+        start = time.perf_counter()
+        similarities.append(
+            detector.frame_similarities(
+                timestamps, path, window_size=window_size, hop_size=hop_size
+            )
+        )
+        elapsed += time.perf_counter() - start
+    return similarities, elapsed
+
+
+def paired_frames(reference, candidate):
+    """Similarities of every frame that was scored in both runs, as two arrays."""
+    ref_frames = [np.zeros(0)]
+    cand_frames = [np.zeros(0)]
+    for ref_segments, cand_segments in zip(reference, candidate):
+        for ref_sims, cand_sims in zip(ref_segments, cand_segments):
+            if ref_sims is None or cand_sims is None:
+                continue
+            valid = ~(np.isnan(ref_sims) | np.isnan(cand_sims))
+            ref_frames.append(ref_sims[valid])
+            cand_frames.append(cand_sims[valid])
+    return np.concatenate(ref_frames), np.concatenate(cand_frames)
+
+
+def detection_scores(similarities, labels, threshold, diff_threshold):
+    """Verdicts, accuracy and F1 at one threshold setting."""
+    y_pred = np.stack(
+        [sweep_thresholds(s, [threshold], [diff_threshold])[0, 0] for s in similarities]
+    )
+    accuracy, f1 = classification_metrics(labels, y_pred)
+    return y_pred, float(accuracy), float(f1)
+
+
+def drift_report(precisions, limit=None, threshold=0.6, diff_threshold=20.0):
+    """
+    Compare each precision in `precisions` with float32 on the labelled corpus.
+
+    Returns:
+        Dictionary with the float32 scores and one entry per precision
+    """
+    names = sorted(GROUND_TRUTH)[:limit]
+    paths = [os.path.join(DATASET_FOLDER, name) for name in names]
+    files = [(path, get_audio_duration(path)) for path in paths]
+    labels = [GROUND_TRUTH[name] for name in names]
+    total_audio = sum(duration for _, duration in files)
+
+    print(f"Scoring {len(files)} files ({total_audio:.0f}s of audio) with float32...")
+    with DoubleVoiceDetector(parallel=False) as detector:
+        reference, reference_time = collect_similarities(detector, files)
+    reference_pred, accuracy, f1 = detection_scores(
+        reference, labels, threshold, diff_threshold
+    )
+
+    report = {
+        "files": len(files),
+        "threshold": threshold,
+        "different_speaker_threshold": diff_threshold,
+        "float32": {
+            "rtf": round(reference_time / total_audio, 5),
+            "accuracy": round(accuracy, 4),
+            "f1_score": round(f1, 4),
+        },
+        "precisions": {},
+    }
+
+    for precision in precisions:
+        with DoubleVoiceDetector(parallel=False, precision=precision) as detector:
+            if detector.precision != precision:
+                print(f"Skipping {precision}: not supported on this machine")
+                continue
+            print(f"Scoring with {precision}...")
+            candidate, candidate_time = collect_similarities(detector, files)
+
+        ref_frames, cand_frames = paired_frames(reference, candidate)
+        deltas = cand_frames - ref_frames
+        abs_deltas = np.abs(deltas)
+        has_frames = len(deltas) > 0
+        pred, accuracy, f1 = detection_scores(
+            candidate, labels, threshold, diff_threshold
+        )
+        report["precisions"][precision] = {
+            "rtf": round(candidate_time / total_audio, 5),
+            "speedup": round(reference_time / candidate_time, 3),
+            "accuracy": round(accuracy, 4),
+            "f1_score": round(f1, 4),
+            "f1_delta": round(f1 - report["float32"]["f1_score"], 4),
+            "verdict_agreement": round(float(np.mean(pred == reference_pred)), 4),
+            "frames": int(len(deltas)),
+            "mean_delta": round(float(np.mean(deltas)), 5) if has_frames else 0.0,
+            "mean_abs_delta": (
+                round(float(np.mean(abs_deltas)), 5) if has_frames else 0.0
+            ),
+            "p95_abs_delta": (
+                round(float(np.percentile(abs_deltas, 95)), 5) if has_frames else 0.0
+            ),
+            "max_abs_delta": round(float(np.max(abs_deltas)), 5) if has_frames else 0.0,
+            # Frames whose similarity crossed the threshold in either direction
+            "flipped_frames": int(
+                np.sum((ref_frames < threshold) != (cand_frames < threshold))
+            ),
+        }
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--precision", action="append", choices=["int8", "bf16"], default=None
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Only use the first N files"
+    )
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--diff-threshold", type=float, default=20.0)
+    parser.add_argument(
+        "--output", default=None, help="Write the report to this JSON file"
+    )
+    args = parser.parse_args(argv)
+
+    report = drift_report(
+        args.precision or ["int8", "bf16"],
+        limit=args.limit,
+        threshold=args.threshold,
+        diff_threshold=args.diff_threshold,
+    )
+
+    print(
+        f"\nfloat32: RTF={report['float32']['rtf']:.4f} "
+        f"accuracy={report['float32']['accuracy']:.3f} F1={report['float32']['f1_score']:.3f}"
+    )
+    for precision, r in report["precisions"].items():
+        print(
+            f"{precision}: RTF={r['rtf']:.4f} ({r['speedup']:.2f}x) "
+            f"accuracy={r['accuracy']:.3f} F1={r['f1_score']:.3f} ({r['f1_delta']:+.3f}) "
+            f"verdicts unchanged={r['verdict_agreement']:.0%}\n"
+            f"    similarity delta: mean={r['mean_delta']:+.4f} "
+            f"mean|d|={r['mean_abs_delta']:.4f} p95|d|={r['p95_abs_delta']:.4f} "
+            f"max|d|={r['max_abs_delta']:.4f}, "
+            f"{r['flipped_frames']}/{r['frames']} frames crossed the threshold"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
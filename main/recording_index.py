@@ -0,0 +1,430 @@
+"""
+Whole-Recording Embedding Index for Timestamp Queries
+"""
+
+import math
+import numpy as np
+from resemblyzer import hparams
+from resemblyzer.audio import wav_to_mel_spectrogram
+from typing import List, Optional, Tuple, Union
+from audio_reader import AudioReader
+from double_voice import (
+    _encode_partials,
+    _failed_segment,
+    _get_encoder,
+    _set_torch_threads,
+    _speech_mask,
+    _summarize_results,
+    _validate_timestamps,
+)
+from encoder_batcher import EncoderBatcher
+
+_SAMPLES_PER_FRAME = hparams.sampling_rate * hparams.mel_window_step // 1000
+_PARTIAL_SAMPLES = hparams.partials_n_frames * _SAMPLES_PER_FRAME
+_PARTIAL_SECONDS = _PARTIAL_SAMPLES / hparams.sampling_rate
+_VAD_WINDOW = hparams.sampling_rate * hparams.vad_window_length // 1000
+# Audio decoded around every chunk so the mel frames and the smoothed voice
+# mask at its edges match a single pass over the whole recording
+_CONTEXT = 10 * _VAD_WINDOW
+# Partials sent through the encoder at once
+_ENCODER_BATCH = 512
+
+
+def _hop_samples(hop_size: float) -> int:
+    # Partials start on mel frame boundaries (10 ms)
+    frames = round(hop_size * 1000 / hparams.mel_window_step)
+    if not 1 <= frames <= hparams.partials_n_frames:
+        raise ValueError("hop_size must be between 0.01 and 1.6 seconds")
+    return frames * _SAMPLES_PER_FRAME
+
+
+def _partial_count(n_samples: int, hop_samples: int) -> int:
+    # Same coverage rule as compute_partial_slices(min_coverage=0.75)
+    covered = n_samples - 0.75 * _PARTIAL_SAMPLES
+    if covered < 0:
+        return 1
+    return int(covered // hop_samples) + 1
+
+
+def _recording_gain(reader: AudioReader, block_seconds: float = 60.0) -> float:
+    # The gain preprocess_wav's volume normalization (increase only, to
+    # audio_norm_target_dBFS) applies, computed over the whole recording
+    block = int(block_seconds * reader.sample_rate)
+    sum_squares = 0.0
+    for start in range(0, len(reader), block):
+        samples = reader.read_samples(start, start + block).astype(np.float64)
+        sum_squares += float(np.dot(samples, samples))
+    if sum_squares == 0:
+        return 1.0
+    dbfs = 10 * math.log10(sum_squares / len(reader))
+    change = hparams.audio_norm_target_dBFS - dbfs
+    return 10 ** (change / 20) if change > 0 else 1.0
+
+
+def _voiced_windows(wav: np.ndarray) -> np.ndarray:
+    # The voice mask trim_long_silences() cuts with, one flag per 30 ms
+    # window; here it only marks partials instead of removing audio, so
+    # every partial keeps its place on the recording's clock
+    flags = _speech_mask(wav, hparams.sampling_rate, hparams.vad_window_length, 3)
+    width = hparams.vad_moving_average_width
+    padded = np.concatenate((np.zeros((width - 1) // 2), flags, np.zeros(width // 2)))
+    smoothed = np.cumsum(padded, dtype=float)
+    smoothed[width:] = smoothed[width:] - smoothed[:-width]
+    mask = np.round(smoothed[width - 1 :] / width).astype(bool)
+    dilation = np.ones(hparams.vad_max_silence_length + 1)
+    return np.convolve(mask, dilation, mode="same") > 0
+
+
+def _embed_recording_chunk(
+    args: Tuple, batcher: Optional[EncoderBatcher] = None
+) -> Tuple[int, np.ndarray]:
+    # Embeddings of partials first .. first + count - 1 of a recording, with
+    # NaN rows for partials with too little voice. Runs in pool workers.
+    (
+        audio,
+        first,
+        count,
+        hop_samples,
+        gain,
+        precision,
+        torch_threads,
+        min_voiced_ratio,
+    ) = args
+    _set_torch_threads(torch_threads)
+
+    start = first * hop_samples
+    stop = (first + count - 1) * hop_samples + _PARTIAL_SAMPLES
+    # Aligned to the VAD window grid, which is also a mel frame boundary
+    chunk_start = max(0, (start - _CONTEXT) // _VAD_WINDOW * _VAD_WINDOW)
+    chunk_stop = stop + _CONTEXT
+    with AudioReader(audio, sample_rate=hparams.sampling_rate) as reader:
+        wav = reader.read_samples(chunk_start, chunk_stop) * np.float32(gain)
+
+    # Voice flags only exist for real audio; the zero padding past the end
+    # of the recording (as in embed_utterance) is not counted
+    voiced = _voiced_windows(wav)
+    real = np.ones(len(voiced))
+    n_padded = math.ceil((chunk_stop - chunk_start) / _VAD_WINDOW) - len(voiced)
+    voiced = np.concatenate((voiced, np.zeros(n_padded)))
+    real = np.concatenate((real, np.zeros(n_padded)))
+    voiced_cumsum = np.concatenate(([0], np.cumsum(voiced)))
+    real_cumsum = np.concatenate(([0], np.cumsum(real)))
+
+    wav = np.pad(wav, (0, chunk_stop - chunk_start - len(wav)))
+    mel = wav_to_mel_spectrogram(wav)
+
+    offsets = np.arange(first, first + count) * hop_samples - chunk_start
+    first_window = offsets // _VAD_WINDOW
+    last_window = -(-(offsets + _PARTIAL_SAMPLES) // _VAD_WINDOW)
+    n_real = real_cumsum[last_window] - real_cumsum[first_window]
+    voiced_ratio = (
+        voiced_cumsum[last_window] - voiced_cumsum[first_window]
+    ) / np.maximum(n_real, 1)
+    keep = np.flatnonzero(voiced_ratio >= min_voiced_ratio)
+
+    enc = _get_encoder(precision)
+    embeddings = np.full(
+        (count, hparams.model_embedding_size), np.nan, dtype=np.float32
+    )
+    for b in range(0, len(keep), _ENCODER_BATCH):
+        rows = keep[b : b + _ENCODER_BATCH]
+        frames = offsets[rows] // _SAMPLES_PER_FRAME
+        mels = np.stack([mel[f : f + hparams.partials_n_frames] for f in frames])
+        embeddings[rows] = _encode_partials(
+            enc, mels, np.arange(len(rows)), len(rows), batcher
+        )
+    return first, embeddings
+
+
+class RecordingIndex:
+    """
+    Partial embeddings of a whole recording, indexed by time.
+
+    The recording is volume-normalized and embedded once, as 1.6 s partials
+    every `hop_size` seconds on the original clock. Instead of trimming long
+    silences (which shifts every later sample), partials with too little
+    voice under the same mask preprocess_wav uses are marked as skipped.
+    Any set of timestamps is then answered by slicing the rows that fall
+    inside each range, so repeated queries on an analysed recording cost
+    microseconds and report exact times.
+
+    Example:
+        index = detector.index_recording("exam.wav")
+        result = index.detect([[0, 10], [600, 660], [3300, 3310]])
+        index.save("exam_index.npz")
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        hop_size: float,
+        duration: float,
+        audio: Optional[str] = None,
+        precision: str = "float32",
+    ):
+        """
+        Args:
+            embeddings: (n_partials, 256) L2-normalized partial embeddings,
+                NaN rows for skipped partials
+            hop_size: Time between partial starts in seconds
+            duration: Length of the recording in seconds
+            audio: Path of the indexed recording
+            precision: Encoder precision the embeddings were computed with
+        """
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.hop_size = float(hop_size)
+        self.duration = float(duration)
+        self.audio = audio
+        self.precision = precision
+        self._starts = np.arange(len(self.embeddings)) * self.hop_size
+        self._centers = self._starts + _PARTIAL_SECONDS / 2
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @classmethod
+    def build(
+        cls,
+        audio: str,
+        hop_size: float = 0.5,
+        precision: str = "float32",
+        min_voiced_ratio: float = 0.5,
+        chunk_seconds: float = 60.0,
+        detector=None,
+        batcher: Optional[EncoderBatcher] = None,
+    ) -> "RecordingIndex":
+        """
+        Embed a whole recording.
+
+        Args:
+            audio: Path to the audio file
+            hop_size: Time between partial starts in seconds, 0.01-1.6 (default: 0.5)
+            precision: Encoder precision when no detector is given (default: "float32")
+            min_voiced_ratio: Fraction of voiced audio a partial needs to be
+                scored (default: 0.5)
+            chunk_seconds: Audio embedded per task; bounds the memory in use
+                (default: 60.0)
+            detector: DoubleVoiceDetector whose worker pool embeds the chunks
+                in parallel and whose precision is used
+            batcher: EncoderBatcher for chunks embedded in this process
+
+        Returns:
+            RecordingIndex of the recording
+        """
+        hop_samples = _hop_samples(hop_size)
+        if detector is not None:
+            precision = detector.precision
+            batcher = batcher or detector.batcher
+        with AudioReader(audio, sample_rate=hparams.sampling_rate) as reader:
+            n_samples = len(reader)
+            gain = _recording_gain(reader)
+
+        n_partials = _partial_count(n_samples, hop_samples)
+        per_chunk = max(1, int(chunk_seconds * hparams.sampling_rate // hop_samples))
+        chunks = [
+            (first, min(per_chunk, n_partials - first))
+            for first in range(0, n_partials, per_chunk)
+        ]
+
+        if detector is not None:
+            plan = detector._plan(
+                [count * hop_samples / hparams.sampling_rate for _, count in chunks],
+                hop_samples / hparams.sampling_rate,
+            )
+        else:
+            plan = {"parallel": False, "torch_threads": None}
+
+        def task(first, count, torch_threads=None):
+            return (
+                audio,
+                first,
+                count,
+                hop_samples,
+                gain,
+                precision,
+                torch_threads,
+                min_voiced_ratio,
+            )
+
+        embeddings = np.empty(
+            (n_partials, hparams.model_embedding_size), dtype=np.float32
+        )
+        if plan["parallel"]:
+            futures = [
+                detector._executor.submit(
+                    _embed_recording_chunk, task(first, count, plan["torch_threads"])
+                )
+                for first, count in chunks
+            ]
+            for future in futures:
+                first, rows = future.result()
+                embeddings[first : first + len(rows)] = rows
+        else:
+            for first, count in chunks:
+                _, rows = _embed_recording_chunk(task(first, count), batcher)
+                embeddings[first : first + len(rows)] = rows
+
+        return cls(
+            embeddings,
+            hop_samples / hparams.sampling_rate,
+            n_samples / hparams.sampling_rate,
+            audio=audio,
+            precision=precision,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RecordingIndex":
+        """Read an index written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            audio = str(data["audio"]) or None
+            return cls(
+                data["embeddings"],
+                float(data["hop_size"]),
+                float(data["duration"]),
+                audio=audio,
+                precision=str(data["precision"]),
+            )
+
+    def save(self, path: str) -> None:
+        """Write the index to a .npz file."""
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            hop_size=self.hop_size,
+            duration=self.duration,
+            audio=self.audio or "",
+            precision=self.precision,
+        )
+
+    @property
+    def times(self) -> np.ndarray:
+        """(n_partials, 2) start and end of every partial in seconds."""
+        return np.stack(
+            (self._starts, np.minimum(self._starts + _PARTIAL_SECONDS, self.duration)),
+            axis=1,
+        )
+
+    def rows(self, start_time: float, end_time: float) -> slice:
+        """
+        Rows of the partials that lie inside [start_time, end_time].
+
+        A range shorter than one partial gets the partials centred inside
+        it, or the nearest one.
+        """
+        if start_time >= self.duration:
+            raise ValueError(f"Start time {start_time}s is beyond audio duration")
+        end_time = min(end_time, self.duration)
+        if start_time >= end_time:
+            raise ValueError("Start time must be less than end time")
+
+        eps = 1e-6
+        lo = int(np.searchsorted(self._starts, start_time - eps, side="left"))
+        hi = int(
+            np.searchsorted(
+                self._starts, end_time - _PARTIAL_SECONDS + eps, side="right"
+            )
+        )
+        if hi <= lo:
+            lo = int(np.searchsorted(self._centers, start_time - eps, side="left"))
+            hi = int(np.searchsorted(self._centers, end_time + eps, side="right"))
+        if hi <= lo:
+            nearest = int(
+                np.argmin(np.abs(self._centers - (start_time + end_time) / 2))
+            )
+            lo, hi = nearest, nearest + 1
+        return slice(lo, hi)
+
+    def embedding(self, start_time: float, end_time: float) -> np.ndarray:
+        """
+        Utterance embedding of a range: the normalized mean of its voiced partials.
+
+        Raises:
+            ValueError: If the range has no voiced partial
+        """
+        rows = self.embeddings[self.rows(start_time, end_time)]
+        rows = rows[~np.isnan(rows[:, 0])]
+        if len(rows) == 0:
+            raise ValueError(f"No voiced audio between {start_time}s and {end_time}s")
+        mean = rows.mean(axis=0)
+        return mean / np.linalg.norm(mean)
+
+    def frame_similarities(
+        self,
+        timestamps: List[List[float]],
+        reference_embedding: Optional[np.ndarray] = None,
+        return_times: bool = False,
+    ) -> List[
+        Union[Optional[np.ndarray], Tuple[Optional[np.ndarray], Optional[np.ndarray]]]
+    ]:
+        """
+        Similarities of every partial in each checked range to the reference.
+
+        Args:
+            timestamps: 2D array of [start, end] time pairs in seconds; the
+                first is the reference unless reference_embedding is given
+            reference_embedding: Embedding to compare against, e.g. from a ReferenceStore
+            return_times: Also return the (n, 2) start and end of every
+                partial on the recording's clock
+
+        Returns:
+            One array per checked range (NaN for skipped partials), or None
+            for invalid ranges; with return_times, (similarities, times) pairs
+        """
+        results = self._results(timestamps, reference_embedding)
+        times = self.times
+        output = []
+        for index, start_time, end_time, frame_sims, error in results:
+            if not return_times:
+                output.append(frame_sims)
+            elif error is not None:
+                output.append((None, None))
+            else:
+                output.append((frame_sims, times[self.rows(start_time, end_time)]))
+        return output
+
+    def detect(
+        self,
+        timestamps: List[List[float]],
+        threshold: float = 0.6,
+        different_speaker_threshold: float = 20.0,
+        reference_embedding: Optional[np.ndarray] = None,
+    ) -> dict:
+        """
+        Detect if multiple speakers are present in the given ranges.
+
+        Args:
+            timestamps: 2D array of [start, end] time pairs in seconds; the
+                first is the reference unless reference_embedding is given
+            threshold: Similarity threshold for frame-level detection (default: 0.6)
+            different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+            reference_embedding: Embedding to compare against, e.g. from a ReferenceStore
+
+        Returns:
+            Dictionary containing detection result, suspicious segments and
+            the number of scored and skipped partials
+        """
+        if timestamps is None or len(timestamps) == 0:
+            return {"multiple_speakers_detected": "NO", "suspicious_segments": []}
+        results = self._results(timestamps, reference_embedding)
+        return _summarize_results(
+            results, threshold, different_speaker_threshold, report_skipped=True
+        )
+
+    def _results(
+        self, timestamps: List[List[float]], reference_embedding: Optional[np.ndarray]
+    ) -> List[Tuple[int, float, float, Optional[np.ndarray], Optional[str]]]:
+        timestamps = _validate_timestamps(timestamps)
+        if reference_embedding is None:
+            reference_embedding = self.embedding(*timestamps[0])
+            timestamps = timestamps[1:]
+
+        results = []
+        for i, (start_time, end_time) in enumerate(timestamps, start=1):
+            start_time, end_time = float(start_time), float(end_time)
+            try:
+                rows = self.embeddings[self.rows(start_time, end_time)]
+            except ValueError as e:
+                results.append(_failed_segment(i, start_time, end_time, e))
+                continue
+            results.append((i, start_time, end_time, rows @ reference_embedding, None))
+        return results
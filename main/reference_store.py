@@ -0,0 +1,261 @@
+"""
+Enrolled Reference Voice Store
+"""
+
+import os
+import json
+import tempfile
+import numpy as np
+import librosa
+from resemblyzer import preprocess_wav
+from resemblyzer import hparams
+from typing import Dict, List, Tuple, Union
+
+Utterance = Union[str, np.ndarray, Tuple[str, float, float]]
+
+
+class ReferenceStore:
+    """
+    Indexed store of enrolled candidate voice embeddings.
+
+    Embeddings are kept in a memory-mapped (n_candidates, 256) float32 matrix
+    next to a JSON map from candidate id to row, so loading a reference is a
+    single row lookup regardless of how many candidates are enrolled. The
+    map names the matrix file and its row count and is always replaced
+    last, atomically, so readers never pair it with rows it does not
+    describe. The store assumes a single writer; any number of processes
+    may read it.
+
+    Example:
+        store = ReferenceStore("references")
+        store.enroll("candidate-42", [("intro.wav", 0.0, 8.0), "sample.wav"])
+        result = detect_double_voice(timestamps, audio=path,
+                                     references=store, reference_id="candidate-42")
+    """
+
+    def __init__(self, directory: str, precision: str = "float32"):
+        """
+        Args:
+            directory: Directory holding the store, created if missing
+            precision: Encoder precision candidates are enrolled with, which
+                must match the detectors that use the store (default: "float32")
+        """
+        # Imported here to avoid a circular import with double_voice
+        from double_voice import _check_precision
+
+        self.directory = os.path.expanduser(directory)
+        self.precision = _check_precision(precision)
+        os.makedirs(self.directory, exist_ok=True)
+        self._index_path = os.path.join(self.directory, "ids.json")
+        self._dim = hparams.model_embedding_size
+        self._ids = {}
+        self._generation = 0
+        self._matrix_path = self._generation_path(0)
+        self._index_mtime = None
+        self._matrix = None
+        self._refresh()
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._ids)
+
+    def __contains__(self, candidate_id: str) -> bool:
+        self._refresh()
+        return candidate_id in self._ids
+
+    def __getstate__(self):
+        # Memory maps are reopened lazily after unpickling in a worker
+        state = self.__dict__.copy()
+        state["_matrix"] = None
+        state["_index_mtime"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._refresh()
+
+    def ids(self) -> List[str]:
+        """Enrolled candidate ids in row order."""
+        self._refresh()
+        return sorted(self._ids, key=self._ids.get)
+
+    def get(self, candidate_id: str) -> np.ndarray:
+        """
+        Reference embedding of an enrolled candidate.
+
+        Raises:
+            KeyError: If the candidate is not enrolled
+        """
+        self._refresh()
+        if candidate_id not in self._ids:
+            raise KeyError(f"Candidate {candidate_id!r} is not enrolled")
+        return np.array(self._matrix[self._ids[candidate_id]])
+
+    def enroll(self, candidate_id: str, utterances: List[Utterance]) -> np.ndarray:
+        """
+        Embed one or more utterances of a candidate and store their average.
+
+        Re-enrolling an existing candidate replaces its embedding in place.
+
+        Args:
+            candidate_id: Identifier used later as reference_id
+            utterances: Audio file paths, (path, start, end) tuples in seconds,
+                or waveforms already sampled at 16 kHz
+
+        Returns:
+            The stored reference embedding
+        """
+        if not utterances:
+            raise ValueError("At least one utterance is required for enrollment")
+
+        # Imported here to avoid a circular import with double_voice
+        from double_voice import _get_encoder
+
+        enc = _get_encoder(self.precision)
+        embeddings = [enc.embed_utterance(_load_utterance(u)) for u in utterances]
+        raw_embed = np.mean(embeddings, axis=0)
+        embedding = (raw_embed / np.linalg.norm(raw_embed, 2)).astype(np.float32)
+        self.add(candidate_id, embedding)
+        return embedding
+
+    def add(self, candidate_id: str, embedding: np.ndarray) -> None:
+        """Store a precomputed reference embedding for a candidate."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.shape != (self._dim,):
+            raise ValueError(f"embedding must have shape ({self._dim},)")
+
+        self._refresh()
+        if candidate_id in self._ids:
+            matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+")
+            row = self._ids[candidate_id]
+            matrix[row * self._dim : (row + 1) * self._dim] = embedding
+            matrix.flush()
+            del matrix
+        else:
+            # Append the row first so the index never points past the matrix
+            with open(self._matrix_path, "ab") as f:
+                f.write(embedding.tobytes())
+            self._ids[candidate_id] = len(self._ids)
+            self._write_index()
+        self._index_mtime = None
+        self._refresh()
+
+    def remove(self, candidate_id: str) -> None:
+        """Remove a candidate; its row is reused by compacting the matrix."""
+        self._refresh()
+        if candidate_id not in self._ids:
+            raise KeyError(f"Candidate {candidate_id!r} is not enrolled")
+
+        keep = [cid for cid in self.ids() if cid != candidate_id]
+        rows = np.array([self._ids[cid] for cid in keep], dtype=np.intp)
+        compacted = (
+            np.array(self._matrix[rows]) if len(rows) else np.empty((0, self._dim))
+        )
+        self._matrix = None
+
+        # The compacted rows go to a new matrix file; readers keep using the
+        # old one until the index that names the new file replaces theirs
+        old_path = self._matrix_path
+        self._generation += 1
+        self._matrix_path = self._generation_path(self._generation)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(compacted.astype(np.float32).tobytes())
+        os.replace(tmp_path, self._matrix_path)
+        self._ids = {cid: row for row, cid in enumerate(keep)}
+        self._write_index()
+        # Readers that mapped the old file keep their mapping
+        os.remove(old_path)
+        self._index_mtime = None
+        self._refresh()
+
+    def _generation_path(self, generation: int) -> str:
+        name = "embeddings.f32" if generation == 0 else f"embeddings.{generation}.f32"
+        return os.path.join(self.directory, name)
+
+    def _write_index(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(
+                {
+                    "dim": self._dim,
+                    "precision": self.precision,
+                    "generation": self._generation,
+                    "rows": len(self._ids),
+                    "ids": self._ids,
+                },
+                f,
+            )
+        os.replace(tmp_path, self._index_path)
+
+    def _refresh(self) -> None:
+        # Reload the id map and remap the matrix when another writer changed them
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            self._ids = {}
+            self._matrix = np.empty((0, self._dim), dtype=np.float32)
+            return
+        if mtime == self._index_mtime and self._matrix is not None:
+            return
+
+        with open(self._index_path) as f:
+            index = json.load(f)
+        try:
+            self._load(index)
+        except FileNotFoundError:
+            # The matrix was replaced after the index was read; the index
+            # naming its successor is already in place
+            with open(self._index_path) as f:
+                index = json.load(f)
+            mtime = os.stat(self._index_path).st_mtime_ns
+            self._load(index)
+        self._index_mtime = mtime
+
+    def _load(self, index: Dict) -> None:
+        if index["dim"] != self._dim:
+            raise ValueError(
+                f"Store has {index['dim']}-d embeddings, expected {self._dim}"
+            )
+        # Stores written before the precision was recorded are float32
+        stored_precision = index.get("precision", "float32")
+        if stored_precision != self.precision:
+            raise ValueError(
+                f"Store was enrolled with {stored_precision} embeddings, "
+                f"expected {self.precision}"
+            )
+        generation = index.get("generation", 0)
+        matrix_path = self._generation_path(generation)
+        # Stores written before the row count was recorded hold exactly as
+        # many rows as ids
+        n_rows = index.get("rows", len(index["ids"]))
+        if os.path.getsize(matrix_path) < n_rows * 4 * self._dim:
+            raise ValueError(
+                f"{matrix_path} holds fewer than the {n_rows} indexed rows"
+            )
+        if n_rows:
+            matrix = np.memmap(
+                matrix_path, dtype=np.float32, mode="r", shape=(n_rows, self._dim)
+            )
+        else:
+            matrix = np.empty((0, self._dim), dtype=np.float32)
+        self._ids = index["ids"]
+        self._generation = generation
+        self._matrix_path = matrix_path
+        self._matrix = matrix
+
+
+def _load_utterance(utterance: Utterance) -> np.ndarray:
+    if isinstance(utterance, np.ndarray):
+        return preprocess_wav(utterance.astype(np.float32))
+    if isinstance(utterance, tuple):
+        path, start_time, end_time = utterance
+        y, _ = librosa.load(
+            path,
+            sr=hparams.sampling_rate,
+            offset=start_time,
+            duration=end_time - start_time,
+        )
+        return preprocess_wav(y)
+    y, _ = librosa.load(utterance, sr=hparams.sampling_rate)
+    return preprocess_wav(y)
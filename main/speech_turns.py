@@ -0,0 +1,188 @@
+"""
+Automatic Speech-Turn Segmentation
+"""
+
+from typing import Dict, List
+import numpy as np
+import webrtcvad
+from audio_reader import AudioReader
+from double_voice import _vad_settings
+from vad import _vad_frames, frame_energy_db, to_pcm16
+
+# Decoded and analysed per step of the single pass over a recording
+_BLOCK_SECONDS = 60
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    # (n, 2) start and stop frame of every run of True
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)), axis=1)
+
+
+def analyze_speech(
+    audio: str,
+    aggressiveness: int = 2,
+    frame_ms: int = 30,
+    energy_range_db: float = 35.0,
+    sample_rate: int = 16000,
+) -> Dict:
+    """
+    Frame-level speech decisions and energy for a whole recording.
+
+    The recording is read once in blocks. Every frame gets a webrtcvad
+    decision over a single int16 buffer and its energy from one vectorized
+    reduction; frames more than energy_range_db below the loudest speech
+    are not counted as speech, which removes VAD triggers on background
+    noise.
+
+    Args:
+        audio: Path to the audio file
+        aggressiveness: webrtcvad mode, 0-3 (default: 2)
+        frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+        energy_range_db: Level below the loudest speech (95th percentile)
+            still counted as speech (default: 35.0)
+        sample_rate: Rate the recording is analysed at (default: 16000)
+
+    Returns:
+        Dictionary with frame_seconds, the speech mask and energy_db per frame
+    """
+    _vad_settings(aggressiveness, frame_ms)
+    frame_samples = sample_rate * frame_ms // 1000
+    block = _BLOCK_SECONDS * sample_rate // frame_samples * frame_samples
+
+    # One VAD instance across the blocks, as in a single pass over the file
+    vad = webrtcvad.Vad(aggressiveness)
+    masks = []
+    energies = []
+    with AudioReader(audio, sample_rate=sample_rate) as reader:
+        for start in range(0, len(reader), block):
+            pcm = to_pcm16(reader.read_samples(start, start + block))
+            masks.append(_vad_frames(vad, pcm, sample_rate, frame_ms, None, bool))
+            energies.append(frame_energy_db(pcm, frame_samples))
+
+    speech = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+    energy_db = np.concatenate(energies) if energies else np.zeros(0)
+    if speech.any():
+        loudest = np.percentile(energy_db[speech], 95)
+        speech &= energy_db >= loudest - energy_range_db
+    return {
+        "frame_seconds": frame_samples / sample_rate,
+        "speech": speech,
+        "energy_db": energy_db,
+    }
+
+
+def speech_turns(
+    audio: str,
+    min_turn: float = 2.0,
+    min_gap: float = 1.0,
+    max_turn: float = 10.0,
+    aggressiveness: int = 2,
+    frame_ms: int = 30,
+    energy_range_db: float = 35.0,
+) -> List[Dict]:
+    """
+    Speech turns of a recording with a cleanliness score for each.
+
+    Speech frames from analyze_speech() are joined across pauses shorter
+    than min_gap, turns shorter than min_turn are dropped, and turns longer
+    than max_turn are split into equal parts, since detection works best on
+    5-15 s segments.
+
+    Args:
+        audio: Path to the audio file
+        min_turn: Shortest turn kept in seconds (default: 2.0)
+        min_gap: Shortest pause that separates two turns in seconds (default: 1.0)
+        max_turn: Longest turn in seconds before it is split (default: 10.0)
+        aggressiveness: webrtcvad mode, 0-3 (default: 2)
+        frame_ms: VAD frame length, 10, 20 or 30 ms (default: 30)
+        energy_range_db: Level below the loudest speech still counted as
+            speech (default: 35.0)
+
+    Returns:
+        List of dictionaries with start, end, speech_ratio (fraction of
+        speech frames), snr_db (speech level over the recording's noise
+        floor) and score, in time order
+    """
+    if min_turn <= 0 or max_turn < min_turn:
+        raise ValueError("Need 0 < min_turn <= max_turn")
+
+    analysis = analyze_speech(audio, aggressiveness, frame_ms, energy_range_db)
+    frame_seconds = analysis["frame_seconds"]
+    speech = analysis["speech"]
+    energy_db = analysis["energy_db"]
+    if not speech.any():
+        return []
+
+    runs = _runs(speech)
+    # Pauses shorter than min_gap stay inside the turn
+    gaps = runs[1:, 0] - runs[:-1, 1]
+    first = np.flatnonzero(np.concatenate(([True], gaps * frame_seconds >= min_gap)))
+    last = np.concatenate((first[1:] - 1, [len(runs) - 1]))
+    starts, stops = runs[first, 0], runs[last, 1]
+    long_enough = (stops - starts) * frame_seconds >= min_turn
+    starts, stops = starts[long_enough], stops[long_enough]
+
+    noise_floor = np.percentile(energy_db, 10)
+    speech_cumsum = np.concatenate(([0], np.cumsum(speech)))
+    max_frames = max(1, int(max_turn / frame_seconds))
+
+    turns = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        n_parts = -(-(stop - start) // max_frames)
+        bounds = np.linspace(start, stop, n_parts + 1).round().astype(int)
+        for part_start, part_stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            n_voiced = speech_cumsum[part_stop] - speech_cumsum[part_start]
+            if n_voiced == 0:
+                # A part cut from inside a pause when max_turn < min_gap
+                continue
+            frames = slice(part_start, part_stop)
+            speech_ratio = n_voiced / (part_stop - part_start)
+            snr_db = float(np.median(energy_db[frames][speech[frames]]) - noise_floor)
+            turns.append(
+                {
+                    "start": round(part_start * frame_seconds, 3),
+                    "end": round(part_stop * frame_seconds, 3),
+                    "speech_ratio": float(speech_ratio),
+                    "snr_db": snr_db,
+                    # Few pauses and a clear margin over the noise floor
+                    "score": float(speech_ratio * min(1.0, max(snr_db, 0.0) / 30.0)),
+                }
+            )
+    return turns
+
+
+def auto_timestamps(
+    audio: str,
+    with_reference: bool = True,
+    min_reference: float = 3.0,
+    **kwargs,
+) -> List[List[float]]:
+    """
+    Timestamps for detection built from the speech turns of a recording.
+
+    Args:
+        audio: Path to the audio file
+        with_reference: Put the cleanest turn at least min_reference seconds
+            long (or the longest turn) first, as the reference (default: True)
+        min_reference: Shortest turn considered as reference in seconds (default: 3.0)
+        **kwargs: Segmentation options of speech_turns()
+
+    Returns:
+        List of [start, end] pairs in seconds: the reference turn, then the
+        other turns in time order
+    """
+    turns = speech_turns(audio, **kwargs)
+    timestamps = [[turn["start"], turn["end"]] for turn in turns]
+    if not with_reference or not turns:
+        return timestamps
+
+    durations = [turn["end"] - turn["start"] for turn in turns]
+    candidates = [i for i, d in enumerate(durations) if d >= min_reference]
+    if candidates:
+        reference = max(candidates, key=lambda i: (turns[i]["score"], durations[i]))
+    else:
+        reference = int(np.argmax(durations))
+    return (
+        [timestamps[reference]] + timestamps[:reference] + timestamps[reference + 1 :]
+    )
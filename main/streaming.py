@@ -0,0 +1,194 @@
+"""
+Streaming Double Voice Detection Module
+"""
+
+import numpy as np
+import soxr
+from collections import deque
+from resemblyzer import preprocess_wav
+from resemblyzer import hparams
+from resemblyzer.audio import normalize_volume
+from typing import List, Dict, Optional, Union
+from double_voice import _get_encoder, _embed_frames, _frame_statistics
+from encoder_batcher import EncoderBatcher
+
+
+def _to_float32(chunk: Union[bytes, np.ndarray]) -> np.ndarray:
+    # Accept raw int16 bytes, int16 arrays or float arrays, mono or (frames, channels)
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        chunk = np.frombuffer(chunk, dtype=np.int16)
+    chunk = np.asarray(chunk)
+    if chunk.ndim == 2:
+        chunk = chunk.mean(axis=1)
+    if chunk.dtype == np.int16:
+        return chunk.astype(np.float32) / 32767
+    return chunk.astype(np.float32, copy=False)
+
+
+class DoubleVoiceStream:
+    """
+    Real-time double voice detection session fed by PCM chunks.
+
+    Chunks of any size are appended to a buffer that never holds more than
+    one analysis window. Each time a window completes it is embedded and
+    compared with the reference, and a verdict is computed over the last
+    `history_size` windows. Feed it from a consumer thread rather than from
+    the audio callback itself.
+
+    Example:
+        stream = DoubleVoiceStream(reference_wav, sample_rate=16000)
+        for event in stream.push(chunk):
+            print(event["similarity"], event["multiple_speakers_detected"])
+    """
+
+    def __init__(
+        self,
+        reference: Optional[np.ndarray] = None,
+        sample_rate: int = 16000,
+        threshold: float = 0.6,
+        different_speaker_threshold: float = 20.0,
+        window_size: float = 1.0,
+        hop_size: float = 0.5,
+        history_size: int = 20,
+        reference_embedding: Optional[np.ndarray] = None,
+        batcher: Optional[EncoderBatcher] = None,
+    ):
+        """
+        Args:
+            reference: Waveform of the reference speaker at `sample_rate`
+            sample_rate: Sampling rate of the reference and of pushed chunks (default: 16000)
+            threshold: Similarity threshold for frame-level detection (default: 0.6)
+            different_speaker_threshold: Percentage threshold for multiple speaker detection (default: 20.0)
+            window_size: Size of the analysis window in seconds (default: 1.0)
+            hop_size: Step size between windows in seconds (default: 0.5)
+            history_size: Number of recent windows the verdict is based on (default: 20)
+            reference_embedding: Precomputed reference embedding, used instead of `reference`
+            batcher: Shared EncoderBatcher, so many live sessions in one
+                process share forward passes
+        """
+        if reference is None and reference_embedding is None:
+            raise ValueError("Either reference or reference_embedding is required")
+        if hop_size <= 0:
+            raise ValueError("hop_size must be positive")
+        if batcher is not None and batcher.precision != "float32":
+            raise ValueError("DoubleVoiceStream requires a float32 batcher")
+
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.different_speaker_threshold = different_speaker_threshold
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.batcher = batcher
+
+        self._enc = _get_encoder()
+
+        if reference_embedding is None:
+            reference = _to_float32(reference)
+            reference_wav = preprocess_wav(reference, source_sr=sample_rate)
+            reference_embedding = self._enc.embed_utterance(reference_wav)
+        self.reference_embedding = np.asarray(reference_embedding, dtype=np.float32)
+
+        self._window_samples = int(hparams.sampling_rate * window_size)
+        self._hop_samples = int(hparams.sampling_rate * hop_size)
+        self._buffer = np.zeros(self._window_samples, dtype=np.float32)
+        self._history = deque(maxlen=history_size)
+        self._resampler = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard buffered audio and the similarity history."""
+        self._fill = 0
+        self._skip = 0
+        self._windows_done = 0
+        self._history.clear()
+        if self.sample_rate != hparams.sampling_rate:
+            self._resampler = soxr.ResampleStream(
+                self.sample_rate, hparams.sampling_rate, 1, dtype="float32"
+            )
+
+    def push(self, chunk: Union[bytes, np.ndarray]) -> List[Dict]:
+        """
+        Append a chunk of PCM audio and analyse every window it completes.
+
+        Args:
+            chunk: int16 bytes, int16 array or float array at `sample_rate`
+
+        Returns:
+            One result dictionary per completed window, oldest first
+        """
+        samples = _to_float32(chunk)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+
+        windows = []
+        starts = []
+        pos = 0
+        while pos < len(samples):
+            if self._skip:
+                n = min(self._skip, len(samples) - pos)
+                self._skip -= n
+                pos += n
+                continue
+
+            n = min(self._window_samples - self._fill, len(samples) - pos)
+            self._buffer[self._fill : self._fill + n] = samples[pos : pos + n]
+            self._fill += n
+            pos += n
+
+            if self._fill == self._window_samples:
+                windows.append(self._normalize(self._buffer.copy()))
+                starts.append(self._windows_done * self._hop_samples)
+                self._windows_done += 1
+                self._advance()
+
+        if not windows:
+            return []
+
+        # Embed all windows completed by this chunk in one forward pass
+        stacked = np.concatenate(windows)
+        offsets = list(range(0, len(stacked), self._window_samples))
+        embeddings = _embed_frames(
+            self._enc, stacked, offsets, self._window_samples, self.batcher
+        )
+        similarities = embeddings @ self.reference_embedding
+
+        events = []
+        for start, similarity in zip(starts, similarities):
+            self._history.append(float(similarity))
+            stats = _frame_statistics(
+                np.array(self._history),
+                self.threshold,
+                self.different_speaker_threshold,
+            )
+            events.append(
+                {
+                    "start": start / hparams.sampling_rate,
+                    "end": (start + self._window_samples) / hparams.sampling_rate,
+                    "similarity": float(similarity),
+                    "is_different": bool(similarity < self.threshold),
+                    "multiple_speakers_detected": (
+                        "YES" if stats["has_multiple_speakers"] else "NO"
+                    ),
+                    "different_frames_percentage": stats["different_frames_percentage"],
+                }
+            )
+        return events
+
+    def _advance(self) -> None:
+        # Keep the overlap with the next window, or skip the gap between windows
+        if self._hop_samples < self._window_samples:
+            keep = self._window_samples - self._hop_samples
+            self._buffer[:keep] = self._buffer[self._hop_samples :]
+            self._fill = keep
+        else:
+            self._fill = 0
+            self._skip = self._hop_samples - self._window_samples
+
+    @staticmethod
+    def _normalize(window: np.ndarray) -> np.ndarray:
+        # Same volume normalization preprocess_wav applies; silence is left as is
+        if not np.any(window):
+            return window
+        return normalize_volume(
+            window, hparams.audio_norm_target_dBFS, increase_only=True
+        ).astype(np.float32)
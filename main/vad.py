@@ -0,0 +1,216 @@
+"""
+Batch Voice Activity Detection over NumPy Buffers
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np
+import soxr
+import webrtcvad
+from audio_reader import AudioReader
+from execution_plan import available_cpus
+
+# Rates webrtcvad accepts; anything else is resampled to VAD_RATE
+VAD_RATES = (8000, 16000, 32000, 48000)
+VAD_RATE = 16000
+
+# Audio per worker task when a file is processed on several cores
+CHUNK_SECONDS = 300.0
+
+# Audio run through the VAD ahead of each chunk and discarded, so its
+# adaptive noise estimate has settled when the chunk starts
+_WARMUP_SECONDS = 10.0
+
+
+def _check_settings(aggressiveness: int, frame_ms: int) -> None:
+    if aggressiveness not in (0, 1, 2, 3):
+        raise ValueError("aggressiveness must be 0, 1, 2 or 3")
+    if frame_ms not in (10, 20, 30):
+        raise ValueError("frame_ms must be 10, 20 or 30")
+
+
+def to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """
+    Samples as a contiguous int16 buffer.
+
+    int16 input is returned as is, without a copy; float input in [-1, 1]
+    is clipped and scaled once.
+    """
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return np.ascontiguousarray(samples)
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def frame_energy_db(pcm: np.ndarray, frame_samples: int) -> np.ndarray:
+    """Energy of every whole frame in dBFS, from one vectorized reduction."""
+    n_frames = len(pcm) // frame_samples
+    frames = pcm[: n_frames * frame_samples].reshape(n_frames, frame_samples)
+    power = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / frame_samples
+    return 10 * np.log10(power / 32767.0**2 + 1e-10)
+
+
+def speech_mask(
+    samples: np.ndarray,
+    sample_rate: int = 16000,
+    aggressiveness: int = 2,
+    frame_ms: int = 30,
+    energy_threshold_db: Optional[float] = None,
+    dtype=bool,
+) -> np.ndarray:
+    """
+    One webrtcvad decision per frame of an in-memory signal.
+
+    The signal is resampled once if webrtcvad does not accept its rate and
+    converted to a single int16 buffer; every frame is then handed to the
+    VAD as a memoryview slice of that buffer, without a per-frame copy.
+
+    Args:
+        samples: Mono float samples in [-1, 1] or int16 samples
+        sample_rate: Sampling rate of `samples` (default: 16000)
+        aggressiveness: webrtcvad mode, 0-3 (default: 2)
+        frame_ms: Frame length, 10, 20 or 30 ms (default: 30)
+        energy_threshold_db: Frames quieter than this many dBFS are marked
+            silent without running the VAD; None runs every frame (default: None)
+        dtype: bool or np.uint8 (default: bool)
+
+    Returns:
+        Array with one entry per whole frame, true for speech
+    """
+    _check_settings(aggressiveness, frame_ms)
+    if sample_rate not in VAD_RATES:
+        samples = soxr.resample(
+            np.asarray(samples, dtype=np.float32),
+            sample_rate,
+            VAD_RATE,
+            quality="soxr_hq",
+        )
+        sample_rate = VAD_RATE
+    vad = webrtcvad.Vad(aggressiveness)
+    return _vad_frames(vad, samples, sample_rate, frame_ms, energy_threshold_db, dtype)
+
+
+def _vad_frames(
+    vad: webrtcvad.Vad,
+    samples: np.ndarray,
+    sample_rate: int,
+    frame_ms: int,
+    energy_threshold_db: Optional[float],
+    dtype,
+) -> np.ndarray:
+    # Decisions of one VAD instance over consecutive frames; the instance
+    # can be reused across buffers to continue a single pass
+    pcm = to_pcm16(samples)
+    frame_samples = sample_rate * frame_ms // 1000
+    n_frames = len(pcm) // frame_samples
+    mask = np.zeros(n_frames, dtype=dtype)
+    if n_frames == 0:
+        return mask
+
+    if energy_threshold_db is None:
+        candidates = range(n_frames)
+    else:
+        candidates = np.flatnonzero(
+            frame_energy_db(pcm, frame_samples) >= energy_threshold_db
+        ).tolist()
+
+    is_speech = vad.is_speech
+    buf = memoryview(pcm).cast("B")
+    frame_bytes = frame_samples * 2
+    for f in candidates:
+        offset = f * frame_bytes
+        mask[f] = is_speech(buf[offset : offset + frame_bytes], sample_rate)
+    return mask
+
+
+def _file_chunk_mask(args) -> np.ndarray:
+    # Speech mask of frames [first, first + n_frames) of a file, with a
+    # warm-up stretch run through the VAD first and then dropped
+    path, first, n_frames, aggressiveness, frame_ms, energy_threshold_db, dtype = args
+    frame_samples = VAD_RATE * frame_ms // 1000
+    warmup = min(first, int(_WARMUP_SECONDS * 1000 // frame_ms))
+    with AudioReader(path, sample_rate=VAD_RATE) as reader:
+        samples = reader.read_samples(
+            (first - warmup) * frame_samples, (first + n_frames) * frame_samples
+        )
+    mask = speech_mask(
+        samples, VAD_RATE, aggressiveness, frame_ms, energy_threshold_db, dtype
+    )
+    return mask[warmup:]
+
+
+def file_speech_mask(
+    path: str,
+    aggressiveness: int = 2,
+    frame_ms: int = 30,
+    energy_threshold_db: Optional[float] = None,
+    dtype=bool,
+    max_workers: Optional[int] = None,
+    chunk_seconds: float = CHUNK_SECONDS,
+) -> np.ndarray:
+    """
+    Speech mask of an audio file at any sampling rate.
+
+    The file is decoded and resampled to 16 kHz once, chunk_seconds at a
+    time. On one core the chunks run through a single VAD instance, exactly
+    like one pass over the whole file. With several cores the chunks run on
+    a process pool, each reading only its own part of the file. Every chunk
+    but the first runs the preceding 10 s through its VAD first, but
+    webrtcvad adapts to all the audio it has seen, so about 1% of frames
+    can still differ from a single pass.
+
+    Args:
+        path: Audio file to analyse
+        aggressiveness: webrtcvad mode, 0-3 (default: 2)
+        frame_ms: Frame length, 10, 20 or 30 ms (default: 30)
+        energy_threshold_db: Frames quieter than this many dBFS are marked
+            silent without running the VAD (default: None, off)
+        dtype: bool or np.uint8 (default: bool)
+        max_workers: Worker processes (default: number of CPUs available
+            to the process)
+        chunk_seconds: Audio per worker task in seconds (default: 300.0)
+
+    Returns:
+        Array with one entry per frame_ms frame of the file, true for speech
+    """
+    _check_settings(aggressiveness, frame_ms)
+    frame_samples = VAD_RATE * frame_ms // 1000
+    with AudioReader(path, sample_rate=VAD_RATE) as reader:
+        n_frames = len(reader) // frame_samples
+
+    chunk_frames = max(1, int(chunk_seconds * 1000 // frame_ms))
+    tasks = [
+        (
+            path,
+            first,
+            min(chunk_frames, n_frames - first),
+            aggressiveness,
+            frame_ms,
+            energy_threshold_db,
+            dtype,
+        )
+        for first in range(0, n_frames, chunk_frames)
+    ]
+    workers = min(max_workers or available_cpus(), len(tasks))
+
+    if workers <= 1:
+        # One VAD instance over all chunks: the same decisions as a single
+        # pass, with only one chunk decoded at a time
+        vad = webrtcvad.Vad(aggressiveness)
+        masks = []
+        with AudioReader(path, sample_rate=VAD_RATE) as reader:
+            for _, first, count, *_ in tasks:
+                samples = reader.read_samples(
+                    first * frame_samples, (first + count) * frame_samples
+                )
+                masks.append(
+                    _vad_frames(
+                        vad, samples, VAD_RATE, frame_ms, energy_threshold_db, dtype
+                    )
+                )
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            masks = list(executor.map(_file_chunk_mask, tasks))
+    if not masks:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(masks)
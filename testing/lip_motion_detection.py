@@ -1,60 +1,173 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-import glob
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 mp_face = mp.solutions.face_mesh
-lips_motion = []
-previous_mouth = None
-
-frame_files = sorted(glob.glob("assets/frames/*.jpg"))
-
-if not frame_files:
-    print("No frame files found in assets/frames/")
-    exit()
-
-print(f"Processing {len(frame_files)} frames...")
-
-with mp_face.FaceMesh(static_image_mode=False, max_num_faces=1) as face_mesh:
-    for frame_path in frame_files:
-        frame = cv2.imread(frame_path)
-
-        if frame is None:
-            print(f"Could not read frame: {frame_path}")
-            lips_motion.append(0)
-            continue
-
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        result = face_mesh.process(rgb)
-
-        if result.multi_face_landmarks:
-            landmarks = result.multi_face_landmarks[0].landmark
-            # Get lip landmarks (inner and outer lips)
-            mouth = np.array(
-                [
-                    (lm.x, lm.y)
-                    for i, lm in enumerate(landmarks)
-                    if i in [61, 84, 17, 314, 405, 320, 307, 375, 321, 308]
-                ]
-            )
-
-            if previous_mouth is not None:
-                # Calculate motion between frames
-                motion = np.mean(np.linalg.norm(mouth - previous_mouth, axis=1))
-                lips_motion.append(motion)
+
+# Outer lip landmarks used for motion
+MOUTH_INDICES = [61, 84, 17, 314, 405, 320, 307, 375, 321, 308]
+# Inner lip centre (upper, lower) used for openness
+OPENNESS_INDICES = [13, 14]
+LANDMARK_INDICES = MOUTH_INDICES + OPENNESS_INDICES
+MOUTH = slice(0, len(MOUTH_INDICES))
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, n_frames
+
+
+def analyze_chunk(args):
+    """Lip landmarks of frames [start, stop) of a video, decoded in memory"""
+    path, start, stop, step, fps = args
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    times = []
+    points = []
+    with mp_face.FaceMesh(static_image_mode=False, max_num_faces=1) as face_mesh:
+        for index in range(start, stop):
+            if (index - start) % step:
+                # Skipped frames are only demuxed and decoded, not converted
+                if not cap.grab():
+                    break
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            position = cap.get(cv2.CAP_PROP_POS_MSEC)
+            times.append(position / 1000 if position > 0 else index / fps)
+
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            result = face_mesh.process(rgb)
+            if result.multi_face_landmarks:
+                landmarks = result.multi_face_landmarks[0].landmark
+                points.append(
+                    [(landmarks[i].x, landmarks[i].y) for i in LANDMARK_INDICES]
+                )
             else:
-                lips_motion.append(0)
+                points.append(np.full((len(LANDMARK_INDICES), 2), np.nan))
+
+    cap.release()
+    return (
+        np.array(times, dtype=np.float64),
+        np.array(points, dtype=np.float32).reshape(-1, len(LANDMARK_INDICES), 2),
+    )
+
+
+def analyze_video(path, chunk_seconds=30.0, max_workers=None, sample_fps=None):
+    """
+    Mouth openness and lip motion for every analysed frame of a video.
+
+    The video is split into chunks of chunk_seconds that are decoded and run
+    through their own FaceMesh in a process pool. Motion is the mean
+    displacement of the outer lip landmarks since the previous analysed
+    frame; it is NaN when either frame has no face.
+
+    Returns:
+        Dictionary of NumPy arrays: times (seconds), openness, motion and
+        face_detected
+    """
+    fps, n_frames = video_info(path)
+    step = max(1, round(fps / sample_fps)) if sample_fps else 1
+    # Chunks start on an analysed frame so sampling is the same as one pass
+    chunk_frames = max(step, int(chunk_seconds * fps) // step * step)
+    if n_frames > 0:
+        chunks = [
+            (path, start, min(start + chunk_frames, n_frames), step, fps)
+            for start in range(0, n_frames, chunk_frames)
+        ]
+    else:
+        # Frame count unknown to the container: decode in one pass
+        chunks = [(path, 0, 2**63 - 1, step, fps)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(analyze_chunk, chunks))
+    else:
+        results = [analyze_chunk(chunk) for chunk in chunks]
+
+    times = np.concatenate([times for times, _ in results])
+    points = np.concatenate([points for _, points in results])
+
+    openness = np.abs(points[:, -2, 1] - points[:, -1, 1])
+    motion = np.full(len(points), np.nan, dtype=np.float32)
+    if len(points) > 1:
+        mouth = points[:, MOUTH]
+        motion[1:] = np.linalg.norm(mouth[1:] - mouth[:-1], axis=2).mean(axis=1)
+    face_detected = ~np.isnan(points[:, 0, 0])
+    if len(points) and face_detected[0]:
+        motion[0] = 0.0
+
+    return {
+        "times": times,
+        "openness": openness,
+        "motion": motion,
+        "face_detected": face_detected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure lip motion over a video file without extracting frames."
+    )
+    parser.add_argument("src", type=str, help="Path to specify source video file")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the time series to this .npz file",
+    )
+    parser.add_argument(
+        "--chunk-seconds", type=float, default=30.0, help="Video length per worker task"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--sample-fps",
+        type=float,
+        default=None,
+        help="Analyse this many frames per second (default: every frame)",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.01, help="Motion that counts as speaking"
+    )
+    args = parser.parse_args()
+
+    series = analyze_video(
+        args.src,
+        chunk_seconds=args.chunk_seconds,
+        max_workers=args.workers,
+        sample_fps=args.sample_fps,
+    )
+    if args.output:
+        np.savez_compressed(args.output, **series)
+
+    motion = series["motion"]
+    print(f"Lip motion analysis complete. Processed {len(motion)} frames.")
+    if not series["face_detected"].any():
+        print("No face detected")
+        return
+
+    print(f"Average motion: {np.nanmean(motion):.4f}")
+    print(f"Max motion: {np.nanmax(motion):.4f}")
 
-            previous_mouth = mouth
-        else:
-            lips_motion.append(0)
+    # Detect speaking frames
+    speaking_frames = np.nan_to_num(motion) > args.threshold
+    speaking_percentage = speaking_frames.mean() * 100
+    print(f"Speaking detected in {speaking_percentage:.1f}% of frames")
 
-print(f"Lip motion analysis complete. Processed {len(lips_motion)} frames.")
-print(f"Average motion: {np.mean(lips_motion):.4f}")
-print(f"Max motion: {max(lips_motion):.4f}")
 
-# Detect speaking frames
-speaking_threshold = 0.01
-speaking_frames = [motion > speaking_threshold for motion in lips_motion]
-speaking_percentage = sum(speaking_frames) / len(speaking_frames) * 100
-print(f"Speaking detected in {speaking_percentage:.1f}% of frames")
+if __name__ == "__main__":
+    main()
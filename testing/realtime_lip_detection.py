@@ -1,7 +1,9 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import threading
 import time
+from collections import deque
 
 
 class RealTimeLipDetector:
@@ -89,8 +91,11 @@ class RealTimeLipDetector:
 
         return mouth_open and good_shape and has_motion
 
-    def update_speaking_status(self, raw_speaking):
-        current_time = time.time()
+    def update_speaking_status(self, raw_speaking, current_time=None):
+        # The hold delay runs on the capture clock when a timestamp is given,
+        # so inference latency does not stretch it
+        if current_time is None:
+            current_time = time.time()
 
         if raw_speaking:
             self.current_speaking_status = True
@@ -105,7 +110,7 @@ class RealTimeLipDetector:
 
         return self.current_speaking_status
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, timestamp=None):
         rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         result = self.face_mesh.process(rgb)
 
@@ -134,35 +139,240 @@ class RealTimeLipDetector:
             self.previous_reference = current_reference
 
             raw_speaking = self.is_speaking_detected(motion, openness, aspect_ratio)
-            speaking_status = self.update_speaking_status(raw_speaking)
+            speaking_status = self.update_speaking_status(raw_speaking, timestamp)
 
             return speaking_status
         else:
-            speaking_status = self.update_speaking_status(False)
+            speaking_status = self.update_speaking_status(False, timestamp)
             return speaking_status
 
 
-def main():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open webcam")
-        return
+class LatestFrameSlot:
+    """Size-1 buffer that holds only the newest frame; unread frames are dropped"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Take the newest frame, or None on timeout or once closed and empty"""
+        with self._condition:
+            if self._item is None and not self._closed:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+def _summary(samples):
+    if not samples:
+        return {"mean": 0.0, "p95": 0.0}
+    values = np.array(samples) * 1000
+    return {"mean": float(values.mean()), "p95": float(np.percentile(values, 95))}
+
+
+class LipDetectionPipeline:
+    """
+    Runs capture and lip detection on separate threads.
+
+    The capture thread reads and flips camera frames into a LatestFrameSlot.
+    The inference thread always takes the newest frame, so a slow FaceMesh
+    pass drops stale frames instead of queueing them and the speaking
+    signal stays close to real time. Results carry the capture timestamp
+    of their frame.
+    """
+
+    def __init__(self, detector, camera_index=0, flip=True, on_result=None, window=300):
+        self.detector = detector
+        self.camera_index = camera_index
+        self.flip = flip
+        self.on_result = on_result
+
+        self._slot = LatestFrameSlot()
+        self._lock = threading.Lock()
+        self._cap = None
+        self._threads = []
+        self._running = False
+        self._frame = None
+        self._result = None
+
+        # Per-stage timings of the last `window` frames, in seconds
+        self._capture_times = deque(maxlen=window)
+        self._inference_times = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._captured = 0
+        self._processed = 0
+        self._started = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        self._cap = cv2.VideoCapture(self.camera_index)
+        if not self._cap.isOpened():
+            raise RuntimeError("Could not open webcam")
+
+        self._running = True
+        self._started = time.time()
+        self._threads = [
+            threading.Thread(
+                target=self._capture_loop, name="lip-capture", daemon=True
+            ),
+            threading.Thread(
+                target=self._inference_loop, name="lip-inference", daemon=True
+            ),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self._slot.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def latest_frame(self):
+        """Newest captured frame, for display"""
+        with self._lock:
+            return self._frame
+
+    def latest_result(self):
+        """Newest detection result, or None before the first frame is processed"""
+        with self._lock:
+            return self._result
+
+    def stats(self):
+        """Frame counts, achieved FPS, drop rate and per-stage latency in ms"""
+        with self._lock:
+            elapsed = max(time.time() - self._started, 1e-9) if self._started else 1.0
+            captured = self._captured
+            processed = self._processed
+            capture_times = list(self._capture_times)
+            inference_times = list(self._inference_times)
+            latencies = list(self._latencies)
+        dropped = self._slot.dropped
+        return {
+            "captured": captured,
+            "processed": processed,
+            "dropped": dropped,
+            "drop_rate": dropped / captured if captured else 0.0,
+            "capture_fps": captured / elapsed,
+            "processed_fps": processed / elapsed,
+            "capture_ms": _summary(capture_times),
+            "inference_ms": _summary(inference_times),
+            "latency_ms": _summary(latencies),
+        }
+
+    def _capture_loop(self):
+        frame_index = 0
+        while self._running:
+            start = time.time()
+            ret, frame = self._cap.read()
+            if not ret:
+                break
+            timestamp = time.time()
+            if self.flip:
+                frame = cv2.flip(frame, 1)
 
-    detector = RealTimeLipDetector(motion_threshold=0.002, speaking_delay=1.0)
+            with self._lock:
+                self._frame = frame
+                self._captured += 1
+                self._capture_times.append(timestamp - start)
+            self._slot.put((frame_index, timestamp, frame))
+            frame_index += 1
 
-    try:
+        self._running = False
+        self._slot.close()
+
+    def _inference_loop(self):
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+            item = self._slot.get(timeout=0.1)
+            if item is None:
+                if not self._running:
+                    break
+                continue
+
+            frame_index, timestamp, frame = item
+            start = time.time()
+            speaking = self.detector.process_frame(frame, timestamp)
+            end = time.time()
+
+            result = {
+                "speaking": speaking,
+                "frame_index": frame_index,
+                "timestamp": timestamp,
+                "latency": end - timestamp,
+            }
+            with self._lock:
+                self._result = result
+                self._processed += 1
+                self._inference_times.append(end - start)
+                self._latencies.append(end - timestamp)
+
+            if self.on_result is not None:
+                self.on_result(result)
+
+
+def print_stats(stats):
+    print(
+        f"Captured {stats['captured']} frames ({stats['capture_fps']:.1f} FPS), "
+        f"processed {stats['processed']} ({stats['processed_fps']:.1f} FPS), "
+        f"dropped {stats['drop_rate'] * 100:.1f}%"
+    )
+    for stage in ("capture_ms", "inference_ms", "latency_ms"):
+        print(
+            f"  {stage}: mean {stats[stage]['mean']:.1f}, p95 {stats[stage]['p95']:.1f}"
+        )
 
-            frame = cv2.flip(frame, 1)
-            speaking = detector.process_frame(frame)
 
-            print("SPEAKING" if speaking else "silent")
+def main():
+    detector = RealTimeLipDetector(motion_threshold=0.002, speaking_delay=1.0)
+    pipeline = LipDetectionPipeline(detector)
+
+    try:
+        pipeline.start()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        detector.face_mesh.close()
+        return
+
+    last_printed = None
+    try:
+        while pipeline.running:
+            result = pipeline.latest_result()
+            if result is not None and result["frame_index"] != last_printed:
+                last_printed = result["frame_index"]
+                print("SPEAKING" if result["speaking"] else "silent")
 
             # Show clean camera feed
-            cv2.imshow("Camera Feed", frame)
+            frame = pipeline.latest_frame()
+            if frame is not None:
+                cv2.imshow("Camera Feed", frame)
 
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"):
@@ -172,9 +382,10 @@ def main():
         print("\nExiting...")
 
     finally:
+        pipeline.stop()
         detector.face_mesh.close()
-        cap.release()
         cv2.destroyAllWindows()
+        print_stats(pipeline.stats())
 
 
 if __name__ == "__main__":
@@ -6,20 +6,115 @@ import os
 from datetime import datetime
 
 
+class RingBuffer:
+    """
+    Preallocated int16 ring buffer with zero-copy views of recent samples.
+
+    Every sample is stored twice, at its ring position and one capacity
+    further, so any range of up to `capacity` recent samples is a single
+    contiguous slice. One producer writes; any number of threads may read.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buffer = np.zeros(2 * capacity, dtype=np.int16)
+        # Samples written since the start, also the position of the next one
+        self.written = 0
+        # Set before a block is stored, so readers can tell which samples a
+        # write in progress is overwriting
+        self._reserved = 0
+
+    def write(self, samples):
+        """Append float samples in [-1, 1] as int16"""
+        total = len(samples)
+        self._reserved = self.written + total
+        # A block longer than the buffer only leaves its end behind
+        samples = samples[-self.capacity :]
+        n = len(samples)
+        pos = (self.written + total - n) % self.capacity
+        pcm = np.clip(samples, -1.0, 1.0) * 32767
+        first = min(n, self.capacity - pos)
+        for offset in (0, self.capacity):
+            self._buffer[offset + pos : offset + pos + first] = pcm[:first]
+        if first < n:
+            # Wrapped: the rest starts at the beginning of both copies
+            rest = n - first
+            self._buffer[:rest] = pcm[first:]
+            self._buffer[self.capacity : self.capacity + rest] = pcm[first:]
+        self.written += total
+
+    def view(self, start, stop):
+        """
+        Read-only view of samples [start, stop), counted from the start of
+        the recording. Raises IndexError once they have been overwritten.
+        The view is live: later writes overwrite it once the producer has
+        gone a whole buffer further.
+        """
+        if stop > self.written or start < self._reserved - self.capacity or start > stop:
+            raise IndexError(f"Samples [{start}, {stop}) are not in the buffer")
+        pos = start % self.capacity
+        view = self._buffer[pos : pos + stop - start]
+        view.flags.writeable = False
+        return view
+
+    def copy(self, start, stop):
+        """
+        Copy of samples [start, stop) and the position its first sample is
+        at. Samples the producer overwrote before or while they were copied
+        are cut from the front.
+        """
+        if stop > self.written or start > stop:
+            raise IndexError(f"Samples [{start}, {stop}) are not in the buffer")
+        pos = start % self.capacity
+        chunk = self._buffer[pos : pos + stop - start].copy()
+        lost = min(stop, self._reserved - self.capacity) - start
+        if lost > 0:
+            return chunk[lost:], start + lost
+        return chunk, start
+
+
 class AudioRecorder:
-    def __init__(self, sample_rate=44100):
+    def __init__(
+        self, sample_rate=44100, directory="assets", segment_seconds=None, buffer_seconds=30.0
+    ):
         self.sample_rate = sample_rate
+        self.directory = directory
+        self.segment_samples = int(segment_seconds * sample_rate) if segment_seconds else None
         self.recording = False
-        self.audio_data = []
+        self.ring = RingBuffer(int(buffer_seconds * sample_rate))
+
+        self.files = []
+        self.dropped = 0
+        self._base = None
+        # Ring position where the current recording started
+        self._start = 0
+        self._data_ready = threading.Event()
+        self._writer = None
 
         # Create assets folder if it doesn't exist
-        if not os.path.exists("assets"):
-            os.makedirs("assets")
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
 
     def audio_callback(self, indata, frames, time, status):
         """Callback function to capture audio"""
         if self.recording:
-            self.audio_data.append(indata.copy())
+            self.ring.write(indata[:, 0])
+            self._data_ready.set()
+
+    def tail(self, seconds):
+        """Zero-copy int16 view of the most recent audio, e.g. for live VAD"""
+        written = self.ring.written
+        n = min(int(seconds * self.sample_rate), written, self.ring.capacity)
+        return self.ring.view(written - n, written)
+
+    def since(self, position):
+        """
+        Zero-copy int16 view of the audio after a sample position, and the
+        position to continue from. Lets a consumer walk the stream without
+        missing samples, as long as it keeps up with the buffer.
+        """
+        written = self.ring.written
+        return self.ring.view(max(position, written - self.ring.capacity), written), written
 
     def input_listener(self):
         """Listen for Enter to stop recording"""
@@ -31,14 +126,81 @@ class AudioRecorder:
             except:
                 break
 
-    def start_recording(self):
+    def _file_path(self, index):
+        if self.segment_samples is None:
+            return os.path.join(self.directory, f"{self._base}.wav")
+        return os.path.join(self.directory, f"{self._base}_{index:03d}.wav")
+
+    def _open_file(self, index):
+        wf = wave.open(self._file_path(index), "wb")
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(self.sample_rate)
+        self.files.append(self._file_path(index))
+        return wf
+
+    def writer_loop(self):
+        """Drain the ring buffer to int16 WAV files, rotating by duration"""
+        flushed = self._start
+        index = 0
+        in_file = 0
+        wf = self._open_file(index)
+        try:
+            while True:
+                self._data_ready.wait(timeout=0.1)
+                self._data_ready.clear()
+                written = self.ring.written
+                if written - flushed > self.ring.capacity:
+                    # The writer fell a whole buffer behind; those samples are gone
+                    self.dropped += written - self.ring.capacity - flushed
+                    flushed = written - self.ring.capacity
+
+                while flushed < written:
+                    n = written - flushed
+                    if self.segment_samples is not None:
+                        n = min(n, self.segment_samples - in_file)
+                    chunk, start = self.ring.copy(flushed, flushed + n)
+                    # Samples overwritten while they were copied are lost too
+                    self.dropped += start - flushed
+                    wf.writeframes(chunk)
+                    flushed += n
+                    in_file += len(chunk)
+                    if self.segment_samples is not None and in_file == self.segment_samples:
+                        wf.close()
+                        index += 1
+                        in_file = 0
+                        wf = self._open_file(index)
+
+                if not self.recording and flushed == self.ring.written:
+                    break
+        finally:
+            wf.close()
+            if in_file == 0 and index > 0:
+                # Rotation opened a file that never received audio
+                os.remove(self.files.pop())
+
+    def start_recording(self, filename=None):
         """Start recording audio"""
+        # Generate filename if not provided
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"recording_{timestamp}"
+        if filename.endswith(".wav"):
+            filename = filename[:-4]
+
+        self._base = filename
+        self.files = []
+        self.dropped = 0
+        self._start = self.ring.written
         self.recording = True
-        self.audio_data = []
 
         print("Recording started...")
         print("Press Enter to stop")
 
+        # Audio is written to disk while recording, so memory stays bounded
+        self._writer = threading.Thread(target=self.writer_loop)
+        self._writer.start()
+
         # Start input listener thread
         input_thread = threading.Thread(target=self.input_listener)
         input_thread.daemon = True
@@ -57,33 +219,24 @@ class AudioRecorder:
             except KeyboardInterrupt:
                 self.recording = False
 
-    def save_recording(self, filename=None):
-        """Save the recorded audio to file"""
-
-        # Generate filename if not provided
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"recording_{timestamp}.wav"
-
-        if not filename.endswith(".wav"):
-            filename += ".wav"
-
-        filepath = os.path.join("assets", filename)
-
-        # Combine all audio chunks
-        audio_array = np.concatenate(self.audio_data, axis=0)
-        audio_int16 = (audio_array * 32767).astype(np.int16)
-
-        # Save as WAV file
-        with wave.open(filepath, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(self.sample_rate)
-            wf.writeframes(audio_int16.tobytes())
+    def save_recording(self):
+        """
+        Wait for the writer to flush the remaining audio to disk and return
+        the list of written files, one per segment when rotating
+        """
+        self.recording = False
+        self._data_ready.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
 
-        print(f"Recording saved: {filepath}")
-        print(f"Duration: {len(audio_array) / self.sample_rate:.2f} seconds")
-        return filepath
+        for filepath in self.files:
+            print(f"Recording saved: {filepath}")
+        duration = (self.ring.written - self._start) / self.sample_rate
+        print(f"Duration: {duration:.2f} seconds")
+        if self.dropped:
+            print(f"Warning: {self.dropped} samples dropped, disk writes fell behind")
+        return list(self.files)
 
 
 def main():
@@ -94,8 +247,8 @@ def main():
         custom_name = None
 
     recorder = AudioRecorder()
-    recorder.start_recording()
-    recorder.save_recording(custom_name)
+    recorder.start_recording(custom_name)
+    recorder.save_recording()
 
 
 if __name__ == "__main__":